@@ -3,6 +3,8 @@ import pandas as pd
 from datetime import datetime
 from matplotlib import cm
 import numpy as np
+import os
+from mentionCube import cubeFilename, loadCube, unionCounts
 
 outputFolder = "output/"
 axesColour = 'darkslategrey'
@@ -65,6 +67,17 @@ def getTimeCounts(data, outputFilename):
     formatPlot(ax)
     plt.savefig(outputFilename, bbox_inches="tight")
 
+def getUnionCounts(cube, outputFilename, top=20):
+    """
+    Plot the number of articles mentioning each of the most mentioned unions, per leaning.
+    """
+    counts = unionCounts(cube, ["leaning"])["articles"].unstack("leaning", fill_value=0)
+    counts = counts.loc[counts.sum(axis=1).sort_values(ascending=False).index[:top]].iloc[::-1]
+    colours = [colourMap(shade) for shade in np.linspace(0.3, 0.9, counts.shape[1])]
+    ax = counts.plot.barh(stacked=True, title="Number of Articles per Union", xlabel="Number of Articles", ylabel="Union", color=colours, alpha=0.9)
+    formatPlot(ax)
+    plt.savefig(outputFilename, bbox_inches="tight")
+
 def main():
     cleanedDataFilename = "data/output/cleanedData.csv"
     fullData = getData(cleanedDataFilename)
@@ -80,6 +93,9 @@ def main():
     getDataDescription(farData)
     filename = outputFolder + "farLeaningCounts.pdf"
     getLeaningCounts(farData, filename)
+    if os.path.exists(cubeFilename):
+        filename = outputFolder + "unionCounts.jpg"
+        getUnionCounts(loadCube(cubeFilename), filename)
 
 
 if __name__ == "__main__":
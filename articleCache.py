@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import pandas as pd
+
+cacheFolder     = "data/output/cache/"
+# Bump this when the cached tables change shape so old caches are ignored
+cacheVersion    = 1
+sampleBytes     = 1 << 20
+
+def fileSignature(filename):
+    """
+    Get a cheap signature of a file: its size, modification time and a hash of
+    its first and last megabyte.
+    """
+    stat = os.stat(filename)
+    digest = hashlib.sha1()
+    with open(filename, "rb") as fp:
+        digest.update(fp.read(sampleBytes))
+        if stat.st_size > sampleBytes:
+            fp.seek(max(sampleBytes, stat.st_size - sampleBytes))
+            digest.update(fp.read(sampleBytes))
+    return [str(filename), stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+
+
+def cacheKey(filenames, *extra):
+    """
+    Get the cache key for a table built from the given source files.
+    """
+    signature = [cacheVersion, [fileSignature(f) for f in filenames], list(extra)]
+    return hashlib.sha1(json.dumps(signature).encode("utf-8")).hexdigest()
+
+
+def cachePaths(name):
+    """
+    Get the table and key paths of a named cache entry.
+    """
+    return cacheFolder + name + ".feather", cacheFolder + name + ".key"
+
+
+def loadCache(name, key):
+    """
+    Load a cached table, or return None if it is missing or out of date.
+    """
+    tablePath, keyPath = cachePaths(name)
+    if not os.path.exists(tablePath) or not os.path.exists(keyPath):
+        return None
+    with open(keyPath) as fp:
+        if fp.read().strip() != key:
+            return None
+    data = pd.read_feather(tablePath)
+    # Feather only stores a default index, so the original labels are a column
+    data = data.set_index("index")
+    data.index.name = None
+    return data
+
+
+def saveCache(name, key, data):
+    """
+    Save a table to the cache under the given key.
+    """
+    os.makedirs(cacheFolder, exist_ok=True)
+    tablePath, keyPath = cachePaths(name)
+    # Remove the old key first so a failed write is never mistaken for a hit
+    if os.path.exists(keyPath):
+        os.remove(keyPath)
+    data.rename_axis("index").reset_index().to_feather(tablePath)
+    with open(keyPath, "w") as fp:
+        fp.write(key)
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+leanings = {
+        "washingtonpost": ["left",False],
+        "breitbart": ["right",True],
+        "cnn": ["left",True],
+        "nytimes": ["left",False],
+        "reuters": ["centre",False],
+        "theatlantic": ["left",False],
+        "newyorker": ["left",True],
+        "foxnews": ["right",True],
+        "alternet": ["left",True],
+        "bloomberg": ["left",False],
+        "theblaze": ["right",True],
+        "nypost": ["right",False],
+        "bbc": ["centre",False],
+        "politico": ["left",False],
+        "dailycaller": ["right",True],
+        "reason": ["right",False],
+        "usatoday": ["left",False],
+        "npr": ["centre",False],
+        "vox": ["left",True],
+        "theguardian": ["left",False],
+        "abcnews": ["left",False],
+        "nationalreview": ["right",True],
+        "cbsnews": ["left",False],
+        "nbcnews": ["left",False],
+        "thehill": ["centre",False],
+        "theintercept": ["left",True],
+        "forbes": ["centre",False],
+        "dailymail": ["right",True],
+        "dailywire": ["right",True],
+        "huffpost": ["left",True],
+        "apnews": ["centre",False],
+        "msn": ["left",True],
+        "csmonitor": ["centre",False],
+        "democracynow": ["left",True],
+        "thefederalist": ["right",True],
+        "washingtonexaminer": ["right",False],
+        "buzzfeed": ["left",True],
+        "washingtontimes": ["right",False],
+        "slate": ["left",True],
+        "economist": ["left",False],
+        "thedailybeast": ["left",True],
+        "spectator": ["right",True],
+        "axios": ["centre",False],
+        "wsj": ["centre",False],
+        "time": ["left",False],
+        "motherjones": ["left",True],
+        "theepochtimes": ["right",False],
+        "foxnewsinsider": ["right",True]
+}
+
+leaningType = pd.CategoricalDtype(["left", "centre", "right"])
+farType     = pd.CategoricalDtype(["left", "right"])
+domainType  = pd.CategoricalDtype(list(leanings))
+
+def getDomainTable():
+    """
+    Get the leaning and far leaning of each domain as category codes, in the
+    order of the domain categories. Domains that do not lean far get code -1.
+    """
+    leaning = pd.Categorical([leanings[domain][0] for domain in domainType.categories], dtype=leaningType)
+    far = []
+    for domain in domainType.categories:
+        if leanings[domain][1] == True:
+            far.append("right" if leanings[domain][0] == "right" else "left")
+        else:
+            far.append(None)
+    far = pd.Categorical(far, dtype=farType)
+    return np.asarray(leaning.codes), np.asarray(far.codes)
+
+
+def constructMetadata(data, far=True):
+    """
+    Construct the metadata for each article. The domain, leaning and far
+    columns are categoricals, with far missing for domains that do not lean far.
+    """
+    domains = data["domain"].astype(domainType)
+    codes = np.asarray(domains.cat.codes)
+    if (codes == -1).any():
+        raise KeyError(sorted(set(data["domain"][codes == -1])))
+    leaningCodes, farCodes = getDomainTable()
+    columns = {
+        "domain": domains,
+        "leaning": pd.Categorical.from_codes(leaningCodes[codes], dtype=leaningType)
+    }
+    if far:
+        columns["far"] = pd.Categorical.from_codes(farCodes[codes], dtype=farType)
+    return data.assign(**columns)
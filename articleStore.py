@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from articleMetadata import leanings
+from unionMatcher import buildMatcher, columnMask, normalizeColumn, normalizeText
+
+storeFilename   = "data/output/articles.sqlite"
+# Number of union phrases OR'd together in one full text query
+phrasesPerQuery = 100
+
+
+def unionPhrase(union):
+    """
+    Get the FTS5 phrase query of a union, or None if it has no words.
+
+    Articles are stored normalized, so their tokens are the words of the
+    normalized text. The phrase skips the empty words of doubled spaces, so it
+    matches every article the matcher would and possibly a few more.
+    """
+    words = normalizeText(union).split()
+    if not words:
+        return None
+    return '"' + " ".join(words) + '"'
+
+
+class ArticleStore:
+    """
+    The articles of one source, such as the cleanData corpus or one scrape
+    file, kept in a SQLite database shared by all sources: their domain,
+    leaning, far leaning, date and url, and an FTS5 index of their
+    normalized title and content. Articles are keyed by their row label.
+
+    The index only finds candidates; filtering still runs the exact matcher,
+    but only over the candidates instead of every article.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # Query results kept for the chunks of a run: stored labels, and
+        # candidate labels and matcher per union list and columns
+        self.stored = None
+        self.lookups = {}
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS sources "
+                                    "(id INTEGER PRIMARY KEY, name TEXT UNIQUE, key TEXT, rows INTEGER)")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def sourceRow(self):
+        return self.connection.execute("SELECT id, key, rows FROM sources WHERE name = ?", (self.source,)).fetchone()
+
+    def isCurrent(self, key) -> bool:
+        """Return whether the store holds the articles of this source as of the given cache key."""
+        row = self.sourceRow()
+        return row is not None and row[1] == key
+
+    def build(self, chunks, key):
+        """
+        Replace the articles of this source with those of the given data
+        frames, which need domain, title, content, date and url columns.
+        The cache key is only recorded once every chunk is in.
+        """
+        self.stored = None
+        self.lookups = {}
+        with self.connection:
+            row = self.sourceRow()
+            if row is None:
+                sourceId = self.connection.execute("INSERT INTO sources (name) VALUES (?)", (self.source,)).lastrowid
+            else:
+                sourceId = row[0]
+                self.connection.execute("UPDATE sources SET key = NULL, rows = NULL WHERE id = ?", (sourceId,))
+            self.connection.execute(f"DROP TABLE IF EXISTS documents_{sourceId}")
+            self.connection.execute(f"DROP TABLE IF EXISTS text_{sourceId}")
+            self.connection.execute(f"CREATE TABLE documents_{sourceId} (article INTEGER PRIMARY KEY, "
+                                    "domain TEXT, leaning TEXT, far TEXT, date, url TEXT)")
+            # Contentless, since filtering only needs the matching row labels
+            self.connection.execute(f"CREATE VIRTUAL TABLE text_{sourceId} USING fts5(title, content, "
+                                    "content='', tokenize='ascii')")
+            numRows = 0
+            for data in chunks:
+                articles = [int(article) for article in data.index]
+                domains = data["domain"].tolist()
+                leaning = [leanings[domain][0] if domain in leanings else None for domain in domains]
+                far = [leanings[domain][0] if domain in leanings and leanings[domain][1] else None
+                       for domain in domains]
+                dates = [None if pd.isna(date) else date.item() if hasattr(date, "item") else date
+                         for date in data["date"]]
+                self.connection.executemany(
+                    f"INSERT INTO documents_{sourceId} VALUES (?, ?, ?, ?, ?, ?)",
+                    zip(articles, domains, leaning, far, dates, data["url"].tolist()))
+                self.connection.executemany(
+                    f"INSERT INTO text_{sourceId} (rowid, title, content) VALUES (?, ?, ?)",
+                    zip(articles, normalizeColumn(data["title"].fillna("").astype(str).tolist()),
+                        normalizeColumn(data["content"].fillna("").astype(str).tolist())))
+                numRows += len(articles)
+            self.connection.execute("UPDATE sources SET key = ?, rows = ? WHERE id = ?", (key, numRows, sourceId))
+
+    def storedArticles(self):
+        """Return the sorted row labels of the stored articles, read once per build."""
+        if self.stored is None:
+            sourceId = self.sourceRow()[0]
+            rows = self.connection.execute(f"SELECT article FROM documents_{sourceId} ORDER BY article")
+            self.stored = np.fromiter((row[0] for row in rows), dtype=np.int64)
+        return self.stored
+
+    def lookup(self, unions, columns):
+        """
+        Return the sorted candidate labels, or None if every article must be
+        checked, and the matcher for a union list and columns. They are
+        computed once and reused for every chunk filtered with the same ones.
+        """
+        key = (tuple(unions), tuple(columns))
+        if key not in self.lookups:
+            if any(unionPhrase(union) is None for union in unions):
+                candidates = None
+            else:
+                candidates = np.sort(np.fromiter(self.candidates(unions, columns), dtype=np.int64))
+            self.lookups[key] = (candidates, buildMatcher(unions))
+        return self.lookups[key]
+
+    def candidates(self, unions, columns):
+        """
+        Return the labels of the stored articles whose columns may mention one
+        of the unions with words, as a set.
+        """
+        sourceId = self.sourceRow()[0]
+        phrases = [phrase for phrase in dict.fromkeys(unionPhrase(union) for union in unions) if phrase]
+        found = set()
+        for start in range(0, len(phrases), phrasesPerQuery):
+            query = "{" + " ".join(columns) + "} : (" + " OR ".join(phrases[start:start + phrasesPerQuery]) + ")"
+            rows = self.connection.execute(f"SELECT rowid FROM text_{sourceId} WHERE text_{sourceId} MATCH ?", (query,))
+            found.update(row[0] for row in rows)
+        return found
+
+    def mask(self, data, unions, columns):
+        """
+        Return the article mask of data, which must hold articles of this
+        source, as filterArticles computes it over the given columns. Only
+        the index candidates and any articles missing from the store are
+        checked with the matcher; a union with no words falls back to
+        checking every article.
+        """
+        candidates, matcher = self.lookup(unions, columns)
+        if candidates is None:
+            check = np.ones(data.shape[0], dtype=bool)
+        else:
+            labels = np.asarray(data.index, dtype=np.int64)
+            check = np.isin(labels, candidates)
+            check |= ~np.isin(labels, self.storedArticles())
+        mask = np.zeros(data.shape[0], dtype=bool)
+        if check.any():
+            mask[check] = columnMask(matcher, [data[column][check].tolist() for column in columns])
+        return pd.Series(mask, index=data.index, dtype=bool)
@@ -0,0 +1,351 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+import cleanData
+import cleanScrapes
+from articleMetadata import constructMetadata, leanings
+from stageProfiler import PeakRss, maxRss
+from unionIndex import IndexBuilder
+from unionMatcher import buildMatcher, normalizeColumn
+
+benchmarkFolder         = "data/output/benchmark/"
+goldenFilename          = "data/output/benchmark/golden.json"
+defaultSizes            = [10000, 100000, 1000000]
+scrapeDomains           = ["breitbart", "vox", "democracynow"]
+scrapeFiles             = 4
+
+
+########################
+### Synthetic corpus ###
+########################
+def makeVocabulary(rng, unions, size=5000):
+    """
+    Make pseudo-words from syllables, with Zipf-like frequencies. Words that
+    are the first word of a union are left out, so filler text never
+    mentions a union by accident.
+    """
+    consonants = list("bcdfghjklmnprstvwz")
+    vowels = list("aeiou")
+    firstWords = {union.split(" ")[0] for union in unions}
+    words = set()
+    while len(words) < size:
+        numSyllables = rng.integers(1, 5)
+        word = "".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(numSyllables))
+        if word not in firstWords:
+            words.add(word)
+    words = sorted(words)
+    weights = 1 / np.arange(1, size + 1)
+    return np.array(words), weights / weights.sum()
+
+
+def makeTextPool(rng, vocabulary, weights, numWords):
+    """
+    Make one long run of text with capitals and punctuation that articles are
+    cut from. Return the text and the offset of each word in it.
+    """
+    words = rng.choice(vocabulary, size=numWords, p=weights)
+    sentenceEnds = rng.random(numWords) < 1 / 15
+    commas = rng.random(numWords) < 1 / 12
+    pieces = []
+    capitalize = True
+    for word, sentenceEnd, comma in zip(words, sentenceEnds, commas):
+        word = str(word)
+        if capitalize:
+            word = word.capitalize()
+        capitalize = bool(sentenceEnd)
+        if sentenceEnd:
+            word += "."
+        elif comma:
+            word += ","
+        pieces.append(word)
+    lengths = np.fromiter((len(piece) + 1 for piece in pieces), dtype=np.int64, count=numWords)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return " ".join(pieces) + " ", offsets
+
+
+def mentionUnion(rng, text, mention):
+    """Put a mention into a text at a random word boundary."""
+    position = text.find(" ", int(rng.integers(0, len(text) + 1)))
+    if position == -1:
+        return text + " " + mention
+    return text[:position] + " " + mention + text[position:]
+
+
+def formatMention(rng, union):
+    """Write a union name the way articles do: lower, title or upper case, maybe in brackets."""
+    style = rng.integers(0, 4)
+    if style == 0:
+        return union
+    if style == 1:
+        return union.title()
+    if style == 2:
+        return union.upper()
+    return "(" + union.upper() + ")"
+
+
+def makeCorpus(numArticles, unions, seed=0, medianWords=250, hitRate=0.25):
+    """
+    Make a deterministic synthetic corpus of numArticles articles. Lengths
+    are log-normal around medianWords, a hitRate fraction of the articles
+    mention a union and as many again mention all but the last word of one,
+    which must not match. Return a frame with url, title, content, domain
+    and created_utc columns.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary, weights = makeVocabulary(rng, unions)
+    pool, offsets = makeTextPool(rng, vocabulary, weights, 1000000)
+    poolWords = len(offsets) - 1
+    unionSet = set(unions)
+    nearMisses = [" ".join(union.split(" ")[:-1]) for union in unions if " " in union]
+    nearMisses = [prefix for prefix in nearMisses if prefix not in unionSet]
+
+    lengths = np.clip(rng.lognormal(np.log(medianWords), 0.8, numArticles), 20, 5000).astype(np.int64)
+    starts = rng.integers(0, poolWords - lengths)
+    titleLengths = rng.integers(5, 16, numArticles)
+    titleStarts = rng.integers(0, poolWords - titleLengths)
+    hits = rng.random(numArticles) < hitRate
+    titleHits = rng.random(numArticles) < hitRate / 5
+    misses = rng.random(numArticles) < hitRate
+    duplicateTitles = rng.random(numArticles) < 0.02
+    domainNames = sorted(leanings)
+    domains = rng.choice(domainNames, numArticles)
+    # Mostly the years studied, and a few from 2006 and 2007 that get dropped
+    createdUtc = rng.integers(1136073600, 1704067200, numArticles)
+
+    titles = []
+    contents = []
+    for i in range(numArticles):
+        content = pool[offsets[starts[i]]:offsets[starts[i] + lengths[i]] - 1]
+        if hits[i]:
+            content = mentionUnion(rng, content, formatMention(rng, unions[rng.integers(0, len(unions))]))
+        if misses[i] and nearMisses:
+            content = mentionUnion(rng, content, nearMisses[rng.integers(0, len(nearMisses))])
+        title = pool[offsets[titleStarts[i]]:offsets[titleStarts[i] + titleLengths[i]] - 1].rstrip(".,")
+        if titleHits[i]:
+            title = mentionUnion(rng, title, formatMention(rng, unions[rng.integers(0, len(unions))]))
+        if duplicateTitles[i] and titles:
+            title = titles[rng.integers(0, len(titles))]
+        titles.append(title)
+        contents.append(content)
+    return pd.DataFrame({
+        "url": [f"https://example.com/article/{seed}/{i}" for i in range(numArticles)],
+        "title": titles,
+        "content": contents,
+        "domain": domains,
+        "created_utc": createdUtc
+    })
+
+
+def corpusFolder(numArticles, seed, medianWords, hitRate):
+    return os.path.join(benchmarkFolder, f"corpus-{numArticles}-{seed}-{medianWords}-{hitRate}")
+
+
+def writeCorpus(corpus, folder):
+    """
+    Write a corpus in the formats the cleaning scripts read: articles.csv and
+    its metadata file for cleanData, and scrape outputs for cleanScrapes.
+    """
+    os.makedirs(os.path.join(folder, "scrapes"), exist_ok=True)
+    articles = corpus[["url", "title", "content"]].rename(columns={"content": "body"})
+    articles.insert(0, "id", range(corpus.shape[0]))
+    articles.to_csv(os.path.join(folder, "articles.csv"), index=False, encoding="utf-8")
+    metadata = corpus[["url", "title", "domain", "created_utc"]].rename(columns={"domain": "actual_domain"})
+    metadata.to_csv(os.path.join(folder, "metadata.csv"), index=False, encoding="utf-8")
+    # Scrapes are from 2023 and only from the scraped sites
+    scrapes = corpus[["url", "title", "content"]].copy()
+    scrapes["date"] = pd.to_datetime(corpus["created_utc"] % 31536000 + 1672531200, unit="s").dt.strftime("%Y-%m-%d")
+    scrapes["domain"] = [scrapeDomains[i % len(scrapeDomains)] for i in range(corpus.shape[0])]
+    scrapes = scrapes[["url", "date", "title", "content", "domain"]]
+    for i in range(scrapeFiles):
+        scrapes.iloc[i::scrapeFiles].to_csv(os.path.join(folder, "scrapes", f"scrape{i}.csv"),
+                                            index=False, encoding="utf-8")
+
+
+def getCorpus(numArticles, unions, seed, medianWords, hitRate):
+    """Return the folder of a corpus, making it if it does not exist yet."""
+    folder = corpusFolder(numArticles, seed, medianWords, hitRate)
+    if not os.path.exists(os.path.join(folder, "done")):
+        print(f"Making a corpus of {numArticles} articles... ", end="", flush=True)
+        start = time.perf_counter()
+        writeCorpus(makeCorpus(numArticles, unions, seed, medianWords, hitRate), folder)
+        open(os.path.join(folder, "done"), "w").close()
+        print(f"done in {time.perf_counter() - start:.1f}s")
+    return folder
+
+
+#################
+### Reference ###
+#################
+def referenceMask(texts, unions):
+    """The original filter: look for each padded union in each padded, normalized text."""
+    mask = []
+    for text in texts:
+        text = " " + re.sub("[^a-zA-Z0-9]", " ", text.lower()) + " "
+        mask.append(any(" " + union + " " in text for union in unions))
+    return np.array(mask, dtype=bool)
+
+
+def referenceLeanings(domains):
+    """The original metadata, with the far leaning of other domains as None instead of -1."""
+    leaning = [leanings[domain][0] for domain in domains]
+    far = [leanings[domain][0] if leanings[domain][1] else None for domain in domains]
+    return leaning, far
+
+
+def digest(data):
+    """Return a short digest of a frame or an array."""
+    if isinstance(data, pd.DataFrame):
+        raw = data.to_csv().encode("utf-8")
+    else:
+        raw = np.asarray(data).tobytes()
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+###############
+### Running ###
+###############
+def runStage(results, name, rowsIn, func, measureMemory):
+    """Run a stage, recording its time, rows per second and peak memory growth."""
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        output = func()
+        seconds = time.perf_counter() - start
+    peak = rss.growth() if measureMemory else None
+    results.append({
+        "stage": name,
+        "rows": rowsIn,
+        "seconds": seconds,
+        "rowsPerSecond": rowsIn / seconds if seconds > 0 else None,
+        "peakMB": peak
+    })
+    peakStr = f"{peak:9.1f} MB" if peak is not None else ""
+    print(f"  {name:<28}{rowsIn:>9} rows {seconds:9.3f}s {rowsIn / max(seconds, 1e-9):>12.0f} rows/s {peakStr}")
+    return output
+
+
+def benchmarkSize(numArticles, unions, args):
+    """Benchmark every stage on a corpus of numArticles articles. Return the results and output digests."""
+    folder = getCorpus(numArticles, unions, args.seed, args.words, args.hit_rate)
+    print(f"{numArticles} articles")
+    results = []
+    digests = {}
+
+    cleanData.metadataFilename = os.path.join(folder, "metadata.csv")
+    data = runStage(results, "getArticleData", numArticles,
+                    lambda: cleanData.getArticleData(os.path.join(folder, "articles.csv"), useCache=False),
+                    args.memory)
+    digests["getArticleData"] = digest(data)
+
+    runStage(results, "normalizeColumn", data.shape[0],
+             lambda: normalizeColumn(data["content"].tolist()), args.memory)
+
+    matcher = buildMatcher(unions)
+    mask = runStage(results, "articleMask", data.shape[0],
+                    lambda: cleanData.articleMask(data, matcher).to_numpy(dtype=bool),
+                    args.memory)
+    digests["articleMask"] = digest(mask)
+
+    kept, eliminated = runStage(results, "filterArticles", data.shape[0],
+                                lambda: cleanData.filterArticles(data, unions, args.workers),
+                                args.memory)
+    digests["filterArticles"] = digest(kept)
+
+    index = IndexBuilder(unions)
+    indexedKept, _ = runStage(results, "filterArticles (indexed)", data.shape[0],
+                              lambda: cleanData.filterArticles(data, unions, args.workers, index=index),
+                              args.memory)
+    indexOk = digest(indexedKept) == digests["filterArticles"]
+
+    kept = runStage(results, "constructMetadata", kept.shape[0],
+                    lambda: constructMetadata(kept), args.memory)
+    digests["constructMetadata"] = digest(kept)
+
+    cleanScrapes.articlesFolder = os.path.join(folder, "scrapes")
+    scrapes = runStage(results, "cleanScrapes.getAllArticles", numArticles,
+                       lambda: cleanScrapes.getAllArticles(unions, args.workers), args.memory)
+    digests["cleanScrapes.getAllArticles"] = digest(scrapes)
+
+    checks = checkReference(data, mask, kept, unions, args.reference_rows)
+    checks["index"] = indexOk
+    print(f"  indexed filter keeps the same articles: {'ok' if indexOk else 'DIFFERS'}; "
+          f"{len(index.build().articleIds)} postings")
+    return results, digests, checks
+
+
+def checkReference(data, mask, kept, unions, numRows):
+    """Compare the first numRows masks and the metadata against the original algorithms."""
+    sample = data.iloc[:numRows]
+    expected = referenceMask(sample["content"], unions)
+    maskOk = bool(np.array_equal(expected, mask[:numRows]))
+    leaning, far = referenceLeanings(kept["domain"])
+    metadataOk = list(kept["leaning"].astype(object)) == leaning and \
+        [None if pd.isna(value) else value for value in kept["far"].astype(object)] == far
+    print(f"  reference check on {sample.shape[0]} rows: mask {'ok' if maskOk else 'DIFFERS'}, "
+          f"hit rate {expected.mean() if len(expected) else 0:.3f}; metadata {'ok' if metadataOk else 'DIFFERS'}")
+    return {"mask": maskOk, "metadata": metadataOk}
+
+
+def compareGolden(golden, key, digests):
+    """Compare the output digests to the golden ones, returning whether they all match."""
+    if key not in golden:
+        print("  no golden outputs for this corpus; use --write-golden to record them")
+        return True
+    different = [stage for stage, value in digests.items() if golden[key].get(stage) != value]
+    if different:
+        print("  golden outputs DIFFER for: " + ", ".join(different))
+    else:
+        print("  outputs match the golden outputs")
+    return not different
+
+
+def main(args):
+    unions = cleanData.getUnions()
+    golden = {}
+    if os.path.exists(goldenFilename):
+        with open(goldenFilename) as fp:
+            golden = json.load(fp)
+    report = {"args": vars(args), "sizes": {}}
+    allOk = True
+    for numArticles in args.sizes:
+        results, digests, checks = benchmarkSize(numArticles, unions, args)
+        key = f"{numArticles}-{args.seed}-{args.words}-{args.hit_rate}"
+        if args.write_golden:
+            golden[key] = digests
+        else:
+            allOk &= compareGolden(golden, key, digests)
+        allOk &= all(checks.values())
+        report["sizes"][numArticles] = {"stages": results, "digests": digests, "reference": checks}
+    report["maxRssMB"] = maxRss()
+    if args.write_golden:
+        os.makedirs(benchmarkFolder, exist_ok=True)
+        with open(goldenFilename, "w") as fp:
+            json.dump(golden, fp, indent=1)
+        print("Golden outputs written to " + goldenFilename)
+    if args.report:
+        with open(args.report, "w") as fp:
+            json.dump(report, fp, indent=1)
+    return allOk
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning pipeline on synthetic articles.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=defaultSizes, help="numbers of articles to run")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+    parser.add_argument("--words", type=int, default=250, help="median number of words in an article")
+    parser.add_argument("--hit-rate", type=float, default=0.25, help="fraction of articles mentioning a union")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes used to filter articles")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="do not report the peak memory growth of each stage")
+    parser.add_argument("--reference-rows", type=int, default=10000,
+                        help="number of rows checked against the original filter")
+    parser.add_argument("--write-golden", action="store_true",
+                        help="record the output digests as the golden outputs instead of checking them")
+    parser.add_argument("--report", default=None, help="file to write the results to as JSON")
+    args = parser.parse_args()
+    if not main(args):
+        raise SystemExit(1)
@@ -1,7 +1,19 @@
-import re
+import argparse
+import glob
+import os
+import numpy as np
 import pandas as pd
 import csv
 import time
+from articleCache import cacheFolder, cacheKey, loadCache, saveCache
+from articleMetadata import constructMetadata, leanings
+from articleStore import ArticleStore, storeFilename
+from incrementalFilter import MatchState
+from mentionCube import CubeBuilder, cubeFilename, saveCube
+from parallelFilter import parallelCounts, parallelMask, workerPool
+from stageProfiler import StageProfiler
+from unionIndex import IndexBuilder, indexFilename
+from unionMatcher import buildMatcher, columnCounts, columnMask
 
 articlesFilename        = "data/input/articles.csv"
 metadataFilename        = "data/input/unions_full_metadata.csv"
@@ -10,65 +22,20 @@ outputFilename          = "data/output/cleanedData.csv"
 farFilename             = "data/output/farData.csv"
 eliminatedFilename      = "data/output/eliminatedData.csv"
 
-leanings = {
-        "washingtonpost": ["left",False],
-        "breitbart": ["right",True],
-        "cnn": ["left",True],
-        "nytimes": ["left",False],
-        "reuters": ["centre",False],
-        "theatlantic": ["left",False],
-        "newyorker": ["left",True],
-        "foxnews": ["right",True],
-        "alternet": ["left",True],
-        "bloomberg": ["left",False],
-        "theblaze": ["right",True],
-        "nypost": ["right",False],
-        "bbc": ["centre",False],
-        "politico": ["left",False],
-        "dailycaller": ["right",True],
-        "reason": ["right",False],
-        "usatoday": ["left",False],
-        "npr": ["centre",False],
-        "vox": ["left",True],
-        "theguardian": ["left",False],
-        "abcnews": ["left",False],
-        "nationalreview": ["right",True],
-        "cbsnews": ["left",False],
-        "nbcnews": ["left",False],
-        "thehill": ["centre",False],
-        "theintercept": ["left",True],
-        "forbes": ["centre",False],
-        "dailymail": ["right",True],
-        "dailywire": ["right",True],
-        "huffpost": ["left",True],
-        "apnews": ["centre",False],
-        "msn": ["left",True],
-        "csmonitor": ["centre",False],
-        "democracynow": ["left",True],
-        "thefederalist": ["right",True],
-        "washingtonexaminer": ["right",False],
-        "buzzfeed": ["left",True],
-        "washingtontimes": ["right",False],
-        "slate": ["left",True],
-        "economist": ["left",False],
-        "thedailybeast": ["left",True],
-        "spectator": ["right",True],
-        "axios": ["centre",False],
-        "wsj": ["centre",False],
-        "time": ["left",False],
-        "motherjones": ["left",True],
-        "theepochtimes": ["right",False],
-        "foxnewsinsider": ["right",True]
-}
-
-def getArticleData(articlesFilename):
-    """
-    Get the initial article data.
+
+def getMetadata():
+    """
+    Get the article metadata.
     """
-    # Load data
-    data        = pd.read_csv(articlesFilename, encoding="utf-8")
     metadata    = pd.read_csv(metadataFilename, encoding="utf-8")
     metadata    = metadata.drop("title", axis=1)
+    return metadata
+
+
+def prepareArticles(data, metadata):
+    """
+    Merge the article data with its metadata and keep the relevant columns.
+    """
     data        = pd.merge(data, metadata, on="url")
     # Get relevant columns
     relevantColumns = ["actual_domain", "title", "body", "created_utc", "url"]
@@ -76,15 +43,148 @@ def getArticleData(articlesFilename):
     # Rename columns
     columnNames = {"actual_domain": "domain", "body": "content", "created_utc": "date"}
     data        = data.rename(columns=columnNames)
-    # Drop Duplicates
-    data = data.drop_duplicates(subset="title", keep='first')
-    # Drop irrelevant dates
+    return data
+
+
+def dropIrrelevantDates(data):
+    """
+    Drop the articles from years we do not study.
+    """
     data["year"] = pd.to_datetime(data["date"], unit="s").dt.year
     data = data[data["year"] != 2006]
     data = data[data["year"] != 2007]
     data = data.drop("year", axis=1)
     return data
 
+
+def getArticleData(articlesFilename, useCache=True, profiler=None):
+    """
+    Get the initial article data. The result is cached on disk and reused
+    while the article and metadata files are unchanged.
+    """
+    profiler = profiler or StageProfiler("getArticleData")
+    key = cacheKey([articlesFilename, metadataFilename])
+    if useCache:
+        with profiler.stage("loadCache") as stage:
+            data = loadCache("articleData", key)
+            stage.rowsOut = None if data is None else data.shape[0]
+        if data is not None:
+            return data
+    # Load data
+    with profiler.stage("readArticles") as stage:
+        data        = pd.read_csv(articlesFilename, encoding="utf-8")
+        stage.rowsOut = data.shape[0]
+    with profiler.stage("readMetadata") as stage:
+        metadata    = getMetadata()
+        stage.rowsOut = metadata.shape[0]
+    with profiler.stage("merge", data.shape[0]) as stage:
+        data        = prepareArticles(data, metadata)
+        stage.rowsOut = data.shape[0]
+    # Drop Duplicates
+    with profiler.stage("dropDuplicates", data.shape[0]) as stage:
+        data = data.drop_duplicates(subset="title", keep='first')
+        stage.rowsOut = data.shape[0]
+    # Drop irrelevant dates
+    with profiler.stage("dropIrrelevantDates", data.shape[0]) as stage:
+        data = dropIrrelevantDates(data)
+        stage.rowsOut = data.shape[0]
+    if useCache:
+        with profiler.stage("saveCache", data.shape[0]):
+            saveCache("articleData", key, data)
+    return data
+
+
+def iterArticleData(articlesFilename, chunkSize):
+    """
+    Get the initial article data in chunks of at most chunkSize articles.
+
+    Titles are de-duplicated across chunks and rows keep the labels they would
+    have had in getArticleData, so the chunks put together give the same data.
+    """
+    metadata        = getMetadata()
+    seenTitles      = set()
+    seenNullTitle   = False
+    numMerged       = 0
+    for chunk in pd.read_csv(articlesFilename, encoding="utf-8", chunksize=chunkSize):
+        data = prepareArticles(chunk, metadata)
+        data.index = pd.RangeIndex(numMerged, numMerged + data.shape[0])
+        numMerged += data.shape[0]
+        # Drop Duplicates, including those first seen in an earlier chunk
+        firstSeen = ~data.duplicated(subset="title", keep="first")
+        # A set lookup per title; isin would rebuild an array from the whole set every chunk
+        firstSeen &= ~np.fromiter((title in seenTitles for title in data["title"]), dtype=bool, count=data.shape[0])
+        if seenNullTitle:
+            firstSeen &= data["title"].notna()
+        data = data[firstSeen]
+        seenTitles.update(data["title"].dropna())
+        seenNullTitle = seenNullTitle or data["title"].isna().any()
+        # Drop irrelevant dates
+        data = dropIrrelevantDates(data)
+        yield data
+
+def stratumOf(data, stratify):
+    """
+    Get the stratum of each article: its domain, its leaning, or one stratum
+    for all articles.
+    """
+    if stratify == "domain":
+        return data["domain"]
+    if stratify == "leaning":
+        return data["domain"].map(lambda domain: leanings.get(domain, ["unknown"])[0])
+    return pd.Series("all", index=data.index)
+
+
+def sampleArticleData(articlesFilename, size, seed=None, stratify=None, chunkSize=10000):
+    """
+    Draw a uniform random sample of the article data while streaming it in
+    chunks, so the whole corpus is never held in memory. Each stratum keeps a
+    reservoir of size articles (Algorithm R); the sample then takes from
+    each reservoir in proportion to the stratum's share of the articles.
+    The same seed gives the same sample whatever the chunk size.
+    """
+    rng = np.random.default_rng(seed)
+    reservoirs = {}
+    counts = {}
+    for chunk in iterArticleData(articlesFilename, chunkSize):
+        strata = stratumOf(chunk, stratify)
+        # Draw one number per article in file order, so chunking does not matter
+        draws = rng.random(chunk.shape[0])
+        for stratum, positions in strata.groupby(strata, sort=False).indices.items():
+            seen = counts.get(stratum, 0)
+            counts[stratum] = seen + len(positions)
+            # Article t of a stratum replaces slot floor(u * (t + 1)) if that is below size
+            t = seen + np.arange(len(positions))
+            slots = np.where(t < size, t, np.floor(draws[positions] * (t + 1)).astype(np.int64))
+            accepted = slots < size
+            pool = reservoirs.get(stratum)
+            poolSlots = [] if pool is None else list(range(pool.shape[0]))
+            candidates = chunk.iloc[positions[accepted]]
+            offset = 0 if pool is None else pool.shape[0]
+            for i, slot in enumerate(slots[accepted]):
+                if slot < len(poolSlots):
+                    poolSlots[slot] = offset + i
+                else:
+                    poolSlots.append(offset + i)
+            pool = candidates if pool is None else pd.concat([pool, candidates])
+            reservoirs[stratum] = pool.iloc[poolSlots]
+    if not reservoirs:
+        return pd.DataFrame(columns=["domain", "title", "content", "date", "url"])
+    # Split the sample between the strata by largest remainder
+    total = sum(counts.values())
+    strataNames = list(reservoirs)
+    shares = np.array([min(size, total) * counts[name] / total for name in strataNames])
+    allocation = np.floor(shares).astype(np.int64)
+    remaining = min(size, total) - allocation.sum()
+    for i in np.argsort(-(shares - allocation), kind="stable")[:remaining]:
+        allocation[i] += 1
+    samples = []
+    for name, amount in zip(strataNames, allocation):
+        reservoir = reservoirs[name]
+        chosen = np.sort(rng.choice(reservoir.shape[0], size=min(amount, reservoir.shape[0]), replace=False))
+        samples.append(reservoir.iloc[chosen])
+    return pd.concat(samples).sort_index()
+
+
 def getUnions():
     """
     Get the union data.
@@ -101,137 +201,348 @@ def getUnions():
     return unions
 
 
-def articleMask(row, unions) -> bool:
+def articleMask(data, matcher) -> pd.Series:
     """
-    Row-wise mask for article filtering.
+    Mask for article filtering, normalizing the content column in one batch.
     """
-    # Clean content
-    tempContent = row.content.lower()
-    tempContent = re.sub("[^a-zA-Z0-9]", " ", tempContent)
-    tempContent = " " + tempContent + " "
+    # The title check used to normalize row.content a second time, so only
+    # the content decides whether an article is kept.
+    return pd.Series(columnMask(matcher, [data["content"].tolist()]), index=data.index, dtype=bool)
 
-    # Clean title
-    tempTitle = row.content.lower()
-    tempTitle = re.sub("[^a-zA-Z0-9]", " ", tempTitle)
-    tempTitle = " " + tempTitle + " "
 
-    explicitUnionCheck = True
-
-    for union in unions:
-        unionCheck = " " + union + " "
-        if unionCheck in tempContent or unionCheck in tempTitle:
-            return True
-    return False
-
-
-def filterArticles(data, unions):
+def filterArticles(data, unions, workers=1, matchState=None, index=None, store=None, pool=None):
     """
-    Filter the articles.
+    Filter the articles. With more than one worker the articles are sharded
+    across a process pool, pool if given, which must be a workerPool of the
+    same unions. With a MatchState, only the articles affected by
+    changes to the union list since the last run are re-checked. With an
+    ArticleStore holding the articles, only the candidates its full text
+    index finds are checked; this takes precedence over the state.
+
+    With an IndexBuilder as index, every mention in the kept articles is
+    counted and added to it. Kept articles are then scanned to the end
+    instead of up to their first mention. The index must have been made for
+    the same union list.
     """
-    # Remove those in the wrong years
-    m = data.apply(articleMask, axis=1, unions=unions)
+    if index is not None:
+        # Repeated names are dropped, so union positions are those of the index
+        unions = list(dict.fromkeys(unions))
+        if index.unions != unions:
+            raise ValueError("the union index was made for a different union list")
+    if data.empty:
+        return data, data
+    if index is not None and matchState is None and store is None:
+        # Count mentions in the same pass as the filtering
+        if workers > 1:
+            counts = parallelCounts(data["content"].tolist(), unions, workers, pool=pool)
+        else:
+            counts = columnCounts(buildMatcher(unions), data["content"].tolist())
+        m = pd.Series([bool(c) for c in counts], index=data.index, dtype=bool)
+        index.add(data.index[m], [c for c in counts if c], data.shape[0])
+        return data[m], data[~m]
+    if store is not None:
+        m = store.mask(data, unions, ["content"])
+    elif matchState is not None:
+        m = matchState.mask([data["content"].tolist()], unions)
+        m = pd.Series(m, index=data.index)
+    elif workers > 1:
+        m = parallelMask([data["content"].tolist()], unions, workers, pool=pool)
+        m = pd.Series(m, index=data.index)
+    else:
+        matcher = buildMatcher(unions)
+        m = articleMask(data, matcher)
     eliminatedData = data[~m]
     keptData = data[m]
+    if index is not None:
+        # The store and the incremental state stop at one mention per article, so count the kept ones
+        content = keptData["content"].tolist()
+        if workers > 1:
+            counts = parallelCounts(content, unions, workers, pool=pool)
+        else:
+            counts = columnCounts(buildMatcher(unions), content)
+        index.add(keptData.index, counts, data.shape[0])
     return keptData, eliminatedData
 
 
 
-def addLeaning(row):
+def constructData(outputTest, workers=1, useCache=True, matchState=None, profiler=None,
+                  sampleSize=None, seed=None, stratify=None, chunkSize=None, index=None, store=None, pool=None):
+    """
+    Coordinate the construction of the data and write to a CSV file for use in the STM model.
+
+    Test data is a sample of sampleSize articles, 200 by default, drawn while
+    the articles are read in chunks of chunkSize. The union mentions of the
+    kept articles are added to index, if given. With an ArticleStore, the
+    articles are filtered through it, (re)building it first if the article
+    or metadata file changed. pool is the workerPool of the run and
+    matchState the MatchState of incremental runs, if any.
+    """
+    profiler = profiler or StageProfiler("cleanData")
+    if outputTest:
+        sampleSize = sampleSize or 200
+        print("Sampling " + str(sampleSize) + " articles for test data... ", end="")
+        with profiler.stage("sampleArticleData") as stage:
+            data = sampleArticleData(articlesFilename, sampleSize, seed, stratify, chunkSize or 10000)
+            stage.rowsOut = data.shape[0]
+        print("done!")
+    else:
+        print("Loading article data... ", end="")
+        with profiler.stage("getArticleData") as stage:
+            data = getArticleData(articlesFilename, useCache, profiler)
+            stage.rowsOut = data.shape[0]
+        print("done!")
+        print("Original total number of documents:", data.shape[0])
+    print("Getting unions... ", end="")
+    with profiler.stage("getUnions") as stage:
+        unions = getUnions()
+        stage.rowsOut = len(unions)
+    print("done!")
+    if store is not None:
+        # Test data is only a sample, so the store is built from the streamed articles
+        chunks = iterArticleData(articlesFilename, chunkSize or 10000) if outputTest else [data]
+        updateStore(store, chunks, profiler)
+    print("Filtering Articles... ", end="")
+    with profiler.stage("filterArticles", data.shape[0]) as stage:
+        data, eliminatedData = filterArticles(data, unions, workers=workers, matchState=matchState, index=index,
+                                              store=store, pool=pool)
+        stage.rowsOut = data.shape[0]
+    print("done!")
+    print("Constructing metadata... ", end="")
+    with profiler.stage("constructMetadata", data.shape[0]) as stage:
+        data = constructMetadata(data)
+        stage.rowsOut = data.shape[0]
+    print("done!")
+    return data, eliminatedData
+
+
+def updateStore(store, chunks, profiler):
     """
-    For the given row, return the leaning associated with that row's domain.
+    Build the article store from the given article data chunks if it does
+    not hold the current articles.
     """
-    return leanings[row.domain][0]
+    key = cacheKey([articlesFilename, metadataFilename])
+    if store.isCurrent(key):
+        return
+    print("Building article store... ", end="")
+    with profiler.stage("buildStore") as stage:
+        store.build(chunks, key)
+        stage.rowsOut = store.sourceRow()[2]
+    print("done!")
 
 
-def addFarLeaning(row):
+def addToSummary(summary, data, eliminatedData, farData):
     """
-    For a given row, return whether that row's domain leans far in either political direction."
+    Add the counts for a batch of cleaned data to a running summary.
     """
-    if leanings[row.domain][1] == True:
-        if leanings[row.domain][0] == "right":
-            return "right"
-        else:
-            return "left"
-    return -1
+    summary["documents"] += data.shape[0]
+    summary["domains"].update(data["domain"].unique())
+    summary["left"] += data[data["leaning"] == "left"].shape[0]
+    summary["right"] += data[data["leaning"] == "right"].shape[0]
+    summary["eliminated"] += eliminatedData.shape[0]
+    summary["far"] += farData.shape[0]
+    return summary
 
 
-def constructMetadata(data):
+def newSummary():
     """
-    Construct the metadata for each article.
+    Get an empty summary.
     """
-    data["leaning"] = data.apply(addLeaning, axis=1)
-    data["far"] = data.apply(addFarLeaning, axis=1)
-    return data
+    return {"documents": 0, "domains": set(), "left": 0, "right": 0, "eliminated": 0, "far": 0}
 
 
-def constructData(outputTest):
+def printSummary(summary):
     """
-    Coordinate the construction of the data and write to a CSV file for use in the STM model.
+    Print a summary of data.
     """
-    print("Loading article data... ", end="")
-    data = getArticleData(articlesFilename)
-    print("done!")
-    print("Original total number of documents:", data.shape[0])
-    if outputTest:
-        print("Restricting to test data length... ", end="")
-        data = data.sample(200)
-        print("done!")
-    print("Getting unions... ", end="")
-    unions = getUnions()
-    print("done!")
-    print("Filtering Articles... ", end="")
-    data, eliminatedData = filterArticles(data, unions)
-    print("done!")
-    print("Constructing metadata... ", end="")
-    data = constructMetadata(data)
-    print("done!")
-    return data, eliminatedData
+    print("Number of documents:", summary["documents"])
+    print("Number of domains:", len(summary["domains"]))
+    print("Number of left-leaning documents:", summary["left"])
+    print("Number of right-leaning documents:", summary["right"])
+    print("Number of eliminated documents:", summary["eliminated"])
+    print("Number of highly polarized documents:", summary["far"])
 
 
 def consoleReport(data, eliminatedData, farData):
     """
     Print a summary of data.
     """
-    print("Number of documents:", data.shape[0])
-    print("Number of domains:", len(data["domain"].unique()))
-    print("Number of left-leaning documents:",
-          data[data["leaning"] == "left"].shape[0])
-    print("Number of right-leaning documents:",
-          data[data["leaning"] == "right"].shape[0])
-    print("Number of eliminated documents:", eliminatedData.shape[0])
-    print("Number of highly polarized documents:", farData.shape[0])
+    printSummary(addToSummary(newSummary(), data, eliminatedData, farData))
+
+
+def streamData(chunkSize, workers=1, matchState=None, profiler=None, index=None, cube=None, store=None,
+               pool=None):
+    """
+    Clean the article data chunk by chunk, appending each cleaned chunk to the
+    output files so only one chunk is held in memory at a time. The union
+    mentions of the kept articles are added to index, and their domains and
+    months to cube, if given. With an ArticleStore, the chunks are filtered
+    through it, after a first streaming pass to build it if needed. Every
+    chunk is sharded across pool, the workerPool of the run, and checked
+    against matchState, the MatchState of incremental runs, if given.
+    """
+    profiler = profiler or StageProfiler("cleanData")
+    print("Getting unions... ", end="")
+    with profiler.stage("getUnions") as stage:
+        unions = getUnions()
+        stage.rowsOut = len(unions)
+    print("done!")
+    if store is not None:
+        updateStore(store, iterArticleData(articlesFilename, chunkSize), profiler)
+    summary = newSummary()
+    first = True
+    chunks = iterArticleData(articlesFilename, chunkSize)
+    i = 0
+    while True:
+        with profiler.stage("getArticleData") as stage:
+            chunk = next(chunks, None)
+            stage.rowsOut = None if chunk is None else chunk.shape[0]
+        if chunk is None:
+            break
+        print("Cleaning chunk " + str(i) + "... ", end="")
+        with profiler.stage("filterArticles", chunk.shape[0]) as stage:
+            data, eliminatedData = filterArticles(chunk, unions, workers=workers, matchState=matchState, index=index,
+                                                  store=store, pool=pool)
+            stage.rowsOut = data.shape[0]
+        with profiler.stage("constructMetadata", data.shape[0]) as stage:
+            data = constructMetadata(data)
+            stage.rowsOut = data.shape[0]
+        if cube is not None:
+            cube.add(data)
+        farData = data[data["far"].notna()]
+        mode = "w" if first else "a"
+        with profiler.stage("writeOutput", data.shape[0]):
+            data.to_csv(outputFilename, sep=",", encoding="utf-8", mode=mode, header=first)
+        with profiler.stage("writeEliminated", eliminatedData.shape[0]):
+            eliminatedData.to_csv(eliminatedFilename, sep=",", encoding="utf-8", mode=mode, header=first)
+        with profiler.stage("writeFar", farData.shape[0]):
+            farData.to_csv(farFilename, sep=",", encoding="utf-8", mode=mode, header=first)
+        addToSummary(summary, data, eliminatedData, farData)
+        first = False
+        i += 1
+        print("done!")
+    return summary
 
 
 
 
-def main(outputTest):
+
+def main(outputTest, workers=1, chunkSize=None, useCache=True, incremental=False,
+         profileFilename=None, sampleFilter=False, args=None, sampleSize=None, seed=None, stratify=None,
+         buildIndex=None, useStore=False):
     startStr = "Cleaning data "
     if outputTest == True:
         startStr += "and outputting test data"
+    elif chunkSize is not None:
+        startStr += "in chunks of " + str(chunkSize) + " and outputting complete data"
     else:
         startStr += "and outputting complete data"
     print("----------")
     print(startStr)
-    data, eliminatedData = constructData(outputTest)
-    print("Outputting full data... ", end="")
-    data.to_csv(outputFilename, sep=",", encoding="utf-8")
-    print("done!")
-    print("Outputting eliminated data... ", end="")
-    eliminatedData.to_csv(eliminatedFilename, sep=",", encoding="utf-8")
-    print("done!")
-    print("Outputting far data... ", end="")
-    farData = data[data["far"] != -1]
-    farData.to_csv(farFilename, sep=",", encoding="utf-8")
-    print("done!")
-    print("Summary Report")
-    consoleReport(data, eliminatedData, farData)
+    profiler = StageProfiler("cleanData", ["filterArticles"] if sampleFilter else [])
+    if buildIndex is None:
+        # Counting scans every kept article in full, which would undo most of
+        # what the incremental state and the article store save
+        buildIndex = not incremental and not useStore
+    index = IndexBuilder(getUnions()) if buildIndex else None
+    cube = CubeBuilder() if buildIndex else None
+    store = ArticleStore(storeFilename, "articles") if useStore else None
+    # One pool for the whole run, so its workers build the matcher only once
+    pool = workerPool(getUnions(), workers) if workers > 1 else None
+    # One state for the whole corpus, keyed by article hash, however it is chunked
+    matchState = MatchState("cleanDataMatches") if incremental and not outputTest else None
+    if chunkSize is not None and not outputTest:
+        summary = streamData(chunkSize, workers=workers, matchState=matchState, profiler=profiler,
+                             index=index, cube=cube, store=store, pool=pool)
+        print("Summary Report")
+        printSummary(summary)
+    else:
+        data, eliminatedData = constructData(outputTest, workers=workers, useCache=useCache,
+                                             matchState=matchState, profiler=profiler, sampleSize=sampleSize,
+                                             seed=seed, stratify=stratify, chunkSize=chunkSize, index=index,
+                                             store=store, pool=pool)
+        if cube is not None:
+            cube.add(data)
+        print("Outputting full data... ", end="")
+        with profiler.stage("writeOutput", data.shape[0]):
+            data.to_csv(outputFilename, sep=",", encoding="utf-8")
+        print("done!")
+        print("Outputting eliminated data... ", end="")
+        with profiler.stage("writeEliminated", eliminatedData.shape[0]):
+            eliminatedData.to_csv(eliminatedFilename, sep=",", encoding="utf-8")
+        print("done!")
+        print("Outputting far data... ", end="")
+        farData = data[data["far"].notna()]
+        with profiler.stage("writeFar", farData.shape[0]):
+            farData.to_csv(farFilename, sep=",", encoding="utf-8")
+        print("done!")
+        print("Summary Report")
+        consoleReport(data, eliminatedData, farData)
+    if index is not None:
+        print("Outputting union index... ", end="")
+        with profiler.stage("writeIndex") as stage:
+            unionIndex = index.build()
+            unionIndex.save(indexFilename)
+            stage.rowsOut = len(unionIndex.articleIds)
+        print("done!")
+        print("Outputting mention cube... ", end="")
+        with profiler.stage("writeCube", len(unionIndex.articleIds)) as stage:
+            mentions = cube.build(unionIndex)
+            saveCube(mentions, cubeFilename)
+            stage.rowsOut = mentions.shape[0]
+        print("done!")
+    if store is not None:
+        store.close()
+    if pool is not None:
+        pool.shutdown()
+    if matchState is not None:
+        with profiler.stage("saveMatchState") as stage:
+            matchState.save()
+            stage.rowsOut = len(matchState.state)
+        # Drop the per-chunk states older streamed runs kept
+        for path in glob.glob(cacheFolder + "cleanDataMatches[0-9]*"):
+            os.remove(path)
+    print("Stage Report")
+    profiler.printSummary()
+    if profileFilename is not None:
+        profiler.writeReport(profileFilename, args)
+        print("Run report written to " + profileFilename)
 
 
 
 if __name__ == "__main__":
-    outputType = input("Type t for test data: ")
-    if outputType == "t":
-        outputTest = True
-    else:
-        outputTest = False
-    main(outputTest)
+    parser = argparse.ArgumentParser(description="Clean the article data.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to filter articles")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the articles in chunks of this many rows to bound memory use")
+    parser.add_argument("--no-cache", dest="useCache", action="store_false",
+                        help="always re-read the article data instead of using the on-disk cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-check the articles affected by changes to the union list since the last run")
+    parser.add_argument("--sample", type=int, default=None,
+                        help="clean a random sample of this many articles as test data, without the prompt")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the test data sample")
+    parser.add_argument("--stratify", choices=["domain", "leaning"], default=None,
+                        help="sample each domain or leaning in proportion to its share of the articles")
+    parser.add_argument("--profile", default=None,
+                        help="write a JSON report of the time, memory and rows of each stage to this file")
+    parser.add_argument("--store", action="store_true",
+                        help="filter through a SQLite full text index of the articles, built on first use, "
+                             "so re-filtering with a changed union list only checks candidate articles")
+    parser.add_argument("--index", dest="buildIndex", action="store_true", default=None,
+                        help="count union mentions and write the union index and mention cube even with "
+                             "--incremental or --store, rescanning every kept article in full")
+    parser.add_argument("--no-index", dest="buildIndex", action="store_false",
+                        help="do not count union mentions or write the union index and mention cube")
+    parser.add_argument("--sample-filter", action="store_true",
+                        help="sample the stack while filtering and report the hottest functions")
+    args = parser.parse_args()
+    outputTest = args.sample is not None
+    if args.chunksize is None and not outputTest:
+        outputType = input("Type t for test data: ")
+        if outputType == "t":
+            outputTest = True
+    main(outputTest, workers=args.workers, chunkSize=args.chunksize, useCache=args.useCache,
+         incremental=args.incremental, profileFilename=args.profile, sampleFilter=args.sample_filter,
+         args=vars(args), sampleSize=args.sample, seed=args.seed, stratify=args.stratify,
+         buildIndex=args.buildIndex, useStore=args.store)
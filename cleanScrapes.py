@@ -1,63 +1,21 @@
-import re
+import argparse
 import pandas as pd
 import csv
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
+from articleCache import cacheKey
+from articleMetadata import constructMetadata
+from articleStore import ArticleStore, storeFilename
+from incrementalFilter import incrementalMask
+from parallelFilter import parallelMask, workerPool
+from unionMatcher import buildMatcher, columnMask
 
 articlesFolder          = "scrapers/output/"
 unionFilename           = "data/output/unions.txt"
 outputFilename          = "data/output/data2023.csv"
 
-leanings = {
-        "washingtonpost": ["left",False],
-        "breitbart": ["right",True],
-        "cnn": ["left",True],
-        "nytimes": ["left",False],
-        "reuters": ["centre",False],
-        "theatlantic": ["left",False],
-        "newyorker": ["left",True],
-        "foxnews": ["right",True],
-        "alternet": ["left",True],
-        "bloomberg": ["left",False],
-        "theblaze": ["right",True],
-        "nypost": ["right",False],
-        "bbc": ["centre",False],
-        "politico": ["left",False],
-        "dailycaller": ["right",True],
-        "reason": ["right",False],
-        "usatoday": ["left",False],
-        "npr": ["centre",False],
-        "vox": ["left",True],
-        "theguardian": ["left",False],
-        "abcnews": ["left",False],
-        "nationalreview": ["right",True],
-        "cbsnews": ["left",False],
-        "nbcnews": ["left",False],
-        "thehill": ["centre",False],
-        "theintercept": ["left",True],
-        "forbes": ["centre",False],
-        "dailymail": ["right",True],
-        "dailywire": ["right",True],
-        "huffpost": ["left",True],
-        "apnews": ["centre",False],
-        "msn": ["left",True],
-        "csmonitor": ["centre",False],
-        "democracynow": ["left",True],
-        "thefederalist": ["right",True],
-        "washingtonexaminer": ["right",False],
-        "buzzfeed": ["left",True],
-        "washingtontimes": ["right",False],
-        "slate": ["left",True],
-        "economist": ["left",False],
-        "thedailybeast": ["left",True],
-        "spectator": ["right",True],
-        "axios": ["centre",False],
-        "wsj": ["centre",False],
-        "time": ["left",False],
-        "motherjones": ["left",True],
-        "theepochtimes": ["right",False],
-        "foxnewsinsider": ["right",True]
-}
 
 def getUnions():
     with open(unionFilename) as fp:
@@ -85,68 +43,89 @@ def getArticleData(articlesFilename):
     data = data.drop_duplicates(subset="title", keep='first')
     return data
 
-def articleMask(row, unions) -> bool:
+def articleMask(data, matcher) -> pd.Series:
     """
-    Row-wise mask for article filtering.
+    Mask for article filtering, normalizing the content and title columns in one batch each.
     """
-    # Clean content
-    tempContent = row.content.lower()
-    tempContent = re.sub("[^a-zA-Z0-9]", " ", tempContent)
-    tempContent = " " + tempContent + " "
+    mask = columnMask(matcher, [data["content"].tolist(), data["title"].tolist()])
+    return pd.Series(mask, index=data.index, dtype=bool)
 
-    # Clean title
-    tempTitle = row.title.lower()
-    tempTitle = re.sub("[^a-zA-Z0-9]", " ", tempTitle)
-    tempTitle = " " + tempTitle + " "
 
-    for union in unions:
-        unionCheck = " " + union + " "
-        if unionCheck in tempContent or unionCheck in tempTitle:
-            return True
-    return False
-
-
-def filterArticles(data, unions):
+def filterArticles(data, unions, workers=1, stateName=None, store=None, pool=None):
     """
-    Filter the articles.
+    Filter the articles. With more than one worker the articles are sharded
+    across a process pool, pool if given, which must be a workerPool of the
+    same unions. With a state name, only the articles affected by
+    changes to the union list since the last run are re-checked. With an
+    ArticleStore holding the articles, only the candidates its full text
+    index finds are checked; this takes precedence over the state.
     """
-    # Remove those in the wrong years
-    m = data.apply(articleMask, axis=1, unions=unions)
+    if data.empty:
+        return data
+    if store is not None:
+        m = store.mask(data, unions, ["content", "title"])
+    elif stateName is not None:
+        m = incrementalMask([data["content"].tolist(), data["title"].tolist()], unions, stateName)
+        m = pd.Series(m, index=data.index)
+    elif workers > 1:
+        m = parallelMask([data["content"].tolist(), data["title"].tolist()], unions, workers, pool=pool)
+        m = pd.Series(m, index=data.index)
+    else:
+        matcher = buildMatcher(unions)
+        m = articleMask(data, matcher)
     keptData = data[m]
     return keptData
 
-def addLeaning(row):
-    return leanings[row["domain"]][0]
-
-
-def constructMetadata(data):
+def processFile(filePath, unions, workers=1, incremental=False, useStore=False, pool=None):
     """
-    Construct the metadata for each article.
+    Load, filter and add metadata to the articles of one scrape file. Return
+    the kept articles and the time it took. With useStore, the articles are
+    filtered through the article store, rebuilding the file's part of it if
+    the file changed. pool is the workerPool shared by every file, if any.
     """
-    data["leaning"] = data.apply(addLeaning, axis=1)
-    return data
-
-
-def getAllArticles(unions):
-    data = pd.DataFrame({
-        "url": [],
-        "date": [],
-        "title": [],
-        "content": [],
-        "domain": [],
-        "leaning": []
-    })
-    for filePath in sorted(Path(articlesFolder).glob('*.csv')):
-        print("Adding data for: " + filePath.name)
-        newData = getArticleData(filePath)
-        newData = filterArticles(newData, unions)
+    start = time.perf_counter()
+    newData = getArticleData(filePath)
+    stateName = "cleanScrapesMatches-" + filePath.stem if incremental else None
+    if useStore:
+        with ArticleStore(storeFilename, "scrapes/" + filePath.name) as store:
+            key = cacheKey([filePath])
+            if not store.isCurrent(key):
+                store.build([newData], key)
+            newData = filterArticles(newData, unions, workers=workers, stateName=stateName, store=store, pool=pool)
+    else:
+        newData = filterArticles(newData, unions, workers=workers, stateName=stateName, pool=pool)
+    newData = constructMetadata(newData, far=False)
+    return newData, time.perf_counter() - start
+
+
+def getAllArticles(unions, workers=1, incremental=False, useStore=False):
+    """
+    Get the kept articles of every scrape file. With more than one worker and
+    more than one file, the files are processed concurrently in a process pool.
+    """
+    filePaths = sorted(Path(articlesFolder).glob('*.csv'))
+    if workers > 1 and len(filePaths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(filePaths))) as pool:
+            results = list(pool.map(processFile, filePaths, repeat(unions), repeat(1), repeat(incremental),
+                                    repeat(useStore)))
+    elif workers > 1:
+        with workerPool(unions, workers) as pool:
+            results = [processFile(filePath, unions, workers=workers, incremental=incremental, useStore=useStore,
+                                   pool=pool) for filePath in filePaths]
+    else:
+        results = [processFile(filePath, unions, workers=workers, incremental=incremental, useStore=useStore)
+                   for filePath in filePaths]
+    frames = []
+    for filePath, (newData, seconds) in zip(filePaths, results):
+        print(f"{filePath.name}: kept {newData.shape[0]} articles in {seconds:.2f}s")
         if newData.empty: continue
-        newData = constructMetadata(newData)
-        data = pd.concat([data, newData], ignore_index=True)
-    return data
+        frames.append(newData)
+    if not frames:
+        return pd.DataFrame(columns=["url", "date", "title", "content", "domain", "leaning"])
+    return pd.concat(frames, ignore_index=True)
 
 
-def constructData():
+def constructData(workers=1, incremental=False, useStore=False):
     """
     Coordinate the construction of the data and write to a CSV file for use in the STM model.
     """
@@ -154,7 +133,7 @@ def constructData():
     unions  = getUnions()
     print("done!")
     print("Loading article data")
-    data    = getAllArticles(unions)
+    data    = getAllArticles(unions, workers=workers, incremental=incremental, useStore=useStore)
     print("done!")
     return data
 
@@ -166,9 +145,9 @@ def consoleReport(data):
 
 
 
-def main():
+def main(workers=1, incremental=False, useStore=False):
     print("Making data!")
-    data = constructData()
+    data = constructData(workers=workers, incremental=incremental, useStore=useStore)
     print("Outputting full data... ", end="")
     data.to_csv(outputFilename, sep=",", encoding="utf-8")
     print("done!")
@@ -178,4 +157,13 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Clean the scraped article data.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to filter articles")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-check the articles affected by changes to the union list since the last run")
+    parser.add_argument("--store", action="store_true",
+                        help="filter through a SQLite full text index of the articles, built on first use, "
+                             "so re-filtering with a changed union list only checks candidate articles")
+    args = parser.parse_args()
+    main(workers=args.workers, incremental=args.incremental, useStore=args.store)
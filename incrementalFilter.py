@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from articleCache import cacheFolder
+from unionMatcher import buildMatcher, findUnions, normalizeColumn
+
+def articleHash(texts) -> str:
+    """
+    Hash the text columns of one article.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def statePaths(name):
+    """
+    Get the match state and lexicon paths of a named match state.
+    """
+    return cacheFolder + name + ".feather", cacheFolder + name + ".json"
+
+
+def loadMatchState(name):
+    """
+    Load the lexicon and the per-article match state saved under name.
+
+    The state maps an article hash to the union name that was found in it,
+    or None if the article was eliminated.
+    """
+    statePath, lexiconPath = statePaths(name)
+    if not os.path.exists(statePath) or not os.path.exists(lexiconPath):
+        return [], {}
+    with open(lexiconPath) as fp:
+        lexicon = json.load(fp)
+    data = pd.read_feather(statePath)
+    witnesses = data["witness"].astype(object).where(data["witness"].notna(), None)
+    return lexicon, dict(zip(data["hash"], witnesses))
+
+
+def saveMatchState(name, lexicon, state):
+    """
+    Save the lexicon and the per-article match state under name.
+    """
+    os.makedirs(cacheFolder, exist_ok=True)
+    statePath, lexiconPath = statePaths(name)
+    if os.path.exists(lexiconPath):
+        os.remove(lexiconPath)
+    data = pd.DataFrame({"hash": list(state.keys()), "witness": list(state.values())}, dtype=object)
+    data.to_feather(statePath)
+    with open(lexiconPath, "w") as fp:
+        json.dump(lexicon, fp)
+
+
+def findWitness(matcher, texts):
+    """
+    Return the first union name found in any of the normalized texts, or None.
+    """
+    for text in texts:
+        for unionIndex, _ in findUnions(matcher, text):
+            return matcher["unions"][unionIndex]
+    return None
+
+
+def findWitnesses(matcher, columns, rows):
+    """
+    Return the witness of each of the given rows of the text columns,
+    normalizing the texts of those rows in one batch per column.
+    """
+    normalized = [normalizeColumn([column[row] for row in rows]) for column in columns]
+    return [findWitness(matcher, texts) for texts in zip(*normalized)]
+
+
+class MatchState:
+    """
+    The match state saved under a name, loaded once and shared by every batch
+    of articles filtered in a run, such as the chunks of a streamed corpus.
+    Articles are looked up by hash alone, so how the corpus is split into
+    batches does not matter. save keeps the articles of this run only.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.oldLexicon, self.oldState = loadMatchState(name)
+        self.lexicon = []
+        self.state = {}
+
+    def mask(self, columns, unions):
+        """
+        Compute the article mask, re-checking only what a lexicon change can affect.
+
+        Eliminated articles are only checked against newly added union names,
+        articles kept because of a removed name are checked against the whole
+        lexicon, and articles not seen before are checked once in full.
+        """
+        oldLexicon = set(self.oldLexicon)
+        lexicon = list(dict.fromkeys(unions))
+        removed = oldLexicon - set(lexicon)
+        added = [union for union in lexicon if union not in oldLexicon]
+        fullMatcher = buildMatcher(lexicon)
+        addedMatcher = buildMatcher(added)
+        if lexicon != self.lexicon:
+            # States checked against another lexicon earlier in the run are not reused
+            self.lexicon = lexicon
+            self.state = {}
+
+        # Decide which matcher, if any, each distinct article is re-checked with
+        keys = []
+        fullRows = []
+        addedRows = []
+        for row, texts in enumerate(zip(*columns)):
+            key = articleHash(texts)
+            keys.append(key)
+            if key in self.state:
+                continue
+            if key not in self.oldState:
+                fullRows.append(row)
+            else:
+                witness = self.oldState[key]
+                if witness is None and added:
+                    addedRows.append(row)
+                elif witness in removed:
+                    fullRows.append(row)
+            self.state[key] = self.oldState.get(key)
+
+        for matcher, rows in [(fullMatcher, fullRows), (addedMatcher, addedRows)]:
+            for row, witness in zip(rows, findWitnesses(matcher, columns, rows)):
+                self.state[keys[row]] = witness
+        numChecked = len(fullRows) + len(addedRows)
+
+        mask = [self.state[key] is not None for key in keys]
+        print("(re-checked " + str(numChecked) + " of " + str(len(mask)) + " articles) ", end="")
+        return mask
+
+    def save(self):
+        """Save the lexicon and the state of the articles filtered in this run."""
+        saveMatchState(self.name, self.lexicon, self.state)
+
+
+def incrementalMask(columns, unions, name):
+    """
+    Compute the article mask of one batch with the match state saved under
+    name, as MatchState.mask does, and save the state for this batch.
+    """
+    matchState = MatchState(name)
+    mask = matchState.mask(columns, unions)
+    matchState.save()
+    return mask
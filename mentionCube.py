@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from articleMetadata import domainType, farType, getDomainTable, leaningType
+
+cubeFilename = "data/output/mentionCube.feather"
+
+
+class CubeBuilder:
+    """
+    Collect the domain and month of each kept article, chunk by chunk, and
+    aggregate the postings of a union index over them.
+    """
+
+    def __init__(self):
+        self.articleIds = []
+        self.domainCodes = []
+        self.months = []
+
+    def add(self, data):
+        """Add the kept articles of a batch, after constructMetadata."""
+        dates = pd.to_datetime(data["date"], unit="s")
+        self.articleIds.append(np.asarray(data.index, dtype=np.int64))
+        self.domainCodes.append(np.asarray(data["domain"].cat.codes, dtype=np.int16))
+        self.months.append(np.asarray(dates.dt.year * 12 + dates.dt.month - 1, dtype=np.int32))
+
+    def build(self, index):
+        """
+        Return the mention and article counts of each union by domain and
+        month, with leaning and far following from the domain. Rows with a
+        missing union count every article of a domain and month once, with
+        all of its mentions, so they give article totals that summing the
+        union rows would overcount.
+        """
+        articleIds = np.concatenate(self.articleIds) if self.articleIds else np.zeros(0, dtype=np.int64)
+        domainCodes = np.concatenate(self.domainCodes) if self.domainCodes else np.zeros(0, dtype=np.int16)
+        months = np.concatenate(self.months) if self.months else np.zeros(0, dtype=np.int32)
+        order = np.argsort(articleIds, kind="stable")
+        articleIds, domainCodes, months = articleIds[order], domainCodes[order], months[order]
+
+        # Find the article of each posting; postings of articles not added are dropped
+        positions = np.searchsorted(articleIds, index.articleIds)
+        found = positions < len(articleIds)
+        found[found] = articleIds[positions[found]] == index.articleIds[found]
+        unionCodes = np.repeat(np.arange(len(index.unions)), np.diff(index.indptr))[found]
+        positions = positions[found]
+        hits = index.hits[found].astype(np.int64)
+
+        postings = pd.DataFrame({"union": unionCodes, "domain": domainCodes[positions],
+                                 "month": months[positions], "mentions": hits})
+        totals = pd.DataFrame({"union": -1, "domain": domainCodes, "month": months,
+                               "mentions": np.bincount(positions, weights=hits,
+                                                       minlength=len(articleIds)).astype(np.int64)})
+        cube = pd.concat([postings, totals], ignore_index=True)
+        cube = cube.groupby(["union", "domain", "month"], sort=True).agg(
+            mentions=("mentions", "sum"), articles=("mentions", "size")).reset_index()
+
+        leaningCodes, farCodes = getDomainTable()
+        domains = np.asarray(cube["domain"])
+        months = np.asarray(cube["month"])
+        return pd.DataFrame({
+            "union": pd.Categorical.from_codes(cube["union"], categories=pd.Index(index.unions)),
+            "domain": pd.Categorical.from_codes(domains, dtype=domainType),
+            "leaning": pd.Categorical.from_codes(leaningCodes[domains], dtype=leaningType),
+            "far": pd.Categorical.from_codes(farCodes[domains], dtype=farType),
+            "month": pd.to_datetime(pd.DataFrame({"year": months // 12, "month": months % 12 + 1, "day": 1})),
+            "mentions": cube["mentions"].to_numpy(),
+            "articles": cube["articles"].to_numpy()
+        })
+
+
+def saveCube(cube, filename=cubeFilename):
+    """Write the cube as a Feather file."""
+    cube.to_feather(filename)
+
+
+def loadCube(filename=cubeFilename):
+    """Read a cube written by saveCube."""
+    return pd.read_feather(filename)
+
+
+def articleCounts(cube, by):
+    """Return the number of articles for each value of the columns in by, such as ["domain", "leaning"]."""
+    totals = cube[cube["union"].isna()]
+    return totals.groupby(by, observed=True)["articles"].sum()
+
+
+def unionCounts(cube, by=()):
+    """Return the mentions and articles of each union, split by the columns in by."""
+    unions = cube[cube["union"].notna()]
+    return unions.groupby(["union"] + list(by), observed=True)[["mentions", "articles"]].sum()
@@ -0,0 +1,109 @@
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from stageProfiler import addWorkerCpu
+from unionMatcher import buildMatcher, columnCounts, columnMask
+
+# Matcher built once per worker process by initWorker, and the CPU seconds
+# of the worker already sent back with a shard
+workerMatcher = None
+workerCpuReported = 0.0
+
+def initWorker(unions):
+    """
+    Build the union matcher once when a worker process starts.
+    """
+    global workerMatcher
+    workerMatcher = buildMatcher(unions)
+
+
+def workerCpu():
+    """
+    Return the CPU seconds this worker used since it last sent them back,
+    starting up and building the matcher included.
+    """
+    global workerCpuReported
+    now = time.process_time()
+    seconds = now - workerCpuReported
+    workerCpuReported = now
+    return seconds
+
+
+def maskShard(columns):
+    """
+    Mask a shard of documents. A document is kept if any of its columns
+    mentions a union. Return the mask and the worker's CPU seconds.
+    """
+    return columnMask(workerMatcher, columns), workerCpu()
+
+
+def countShard(columns):
+    """
+    Count the union mentions in each document of a shard's first column.
+    Return the counts and the worker's CPU seconds.
+    """
+    return columnCounts(workerMatcher, columns[0]), workerCpu()
+
+
+def workerPool(unions, workers):
+    """
+    Start a process pool whose workers each build the matcher of the unions,
+    to be shared by every batch filtered in a run. Repeated names are
+    dropped, so counts are by position in the list IndexBuilder keeps.
+
+    Its workers send their CPU time back with each shard, which is added to
+    the profiled stage running it, so shut the pool down outside any stage
+    or their CPU time would be counted again as they exit.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                               initargs=(list(dict.fromkeys(unions)),))
+
+
+def mapShards(func, columns, unions, workers, shardsPerWorker=4, pool=None):
+    """
+    Run func over contiguous shards of the rows on a process pool and join
+    the per-row results back in order.
+
+    columns is a list of equally long lists of text, one per checked column.
+    pool is a workerPool for the same unions; without one, a pool is started
+    for this call only.
+    """
+    numRows = len(columns[0])
+    if numRows == 0:
+        return []
+    numShards = min(numRows, workers * shardsPerWorker)
+    bounds = np.linspace(0, numRows, numShards + 1).astype(int)
+    shards = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        shards.append([column[start:end] for column in columns])
+    ownPool = pool is None
+    if ownPool:
+        pool = workerPool(unions, workers)
+    results = []
+    cpuSeconds = 0.0
+    try:
+        for shardResults, shardCpu in pool.map(func, shards):
+            results.extend(shardResults)
+            cpuSeconds += shardCpu
+    finally:
+        if ownPool:
+            # The workers exit here, so the stage already counts their CPU time
+            pool.shutdown()
+    if not ownPool:
+        addWorkerCpu(cpuSeconds)
+    return results
+
+
+def parallelMask(columns, unions, workers, shardsPerWorker=4, pool=None):
+    """
+    Compute the article mask over a process pool.
+    """
+    return np.array(mapShards(maskShard, columns, unions, workers, shardsPerWorker, pool), dtype=bool)
+
+
+def parallelCounts(column, unions, workers, shardsPerWorker=4, pool=None):
+    """
+    Compute the union mention counts of each document of a column over a
+    process pool, as columnCounts would.
+    """
+    return mapShards(countShard, [column], unions, workers, shardsPerWorker, pool)
@@ -0,0 +1,101 @@
+import argparse
+import glob
+import time
+from bs4 import BeautifulSoup
+import breitbart
+import democracynow
+import extract
+import vox
+
+########################################################
+### Full-page parsing, as the scrapers used to do it ###
+########################################################
+def full_parse_breitbart(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('section', id='MainW').find('h1')
+    title = title_tag.get_text().strip() if title_tag else 'No title found'
+    content_tag = soup.find('section', id='MainW').find('div', class_='entry-content')
+    content = ' '.join(p.get_text().strip() for p in content_tag.find_all('p')) if content_tag else 'No content found'
+    return title, content
+
+
+def full_parse_vox(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('h1', class_='c-page-title')
+    title = title_tag.get_text().strip() if title_tag else 'No title found'
+    summary_tag = soup.find('p', class_='c-entry-summary')
+    summary = summary_tag.get_text().strip() if summary_tag else 'No summary found'
+    content_tag = soup.find('div', class_='c-entry-content')
+    content = ' '.join(p.get_text().strip() for p in content_tag.find_all('p')) if content_tag else 'No content found'
+    return title, summary + " " + content
+
+
+def full_parse_dn(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('div', id='story_content').find('h1')
+    title = title_tag.get_text().strip() if title_tag else 'No title found'
+    summary_tag = soup.find('div', id='story_text').find('div', class_='story_summary').find('p')
+    story_summary = summary_tag.get_text().strip() if summary_tag else 'No summary found'
+    transcript_tag = soup.find('div', id='transcript')
+    transcript = ' '.join(p.get_text().strip() for p in transcript_tag.find_all('p')) if transcript_tag else 'No transcript found'
+    return title, story_summary + " " + transcript
+
+
+sites = {
+    "breitbart": (full_parse_breitbart, breitbart.parse_article),
+    "vox": (full_parse_vox, vox.parse_article),
+    "democracynow": (full_parse_dn, democracynow.parse_article_dn)
+}
+
+
+def synthetic_page(i):
+    """Build a page with the markup of all three sites and a lot of filler."""
+    filler = "".join(f'<div class="nav"><a href="/link/{j}">Link {j}</a><p>Related story {j}</p></div>' for j in range(300))
+    return f"""<html><head><title>Page {i}</title></head><body>{filler}
+<section id="MainW"><h1> Headline {i} </h1><div class="entry-content"><p>First paragraph.</p><p>Union workers went on strike.</p></div></section>
+<h1 class="c-page-title">Headline {i}</h1><p class="c-entry-summary">Summary {i}</p>
+<div class="c-entry-content"><p>Body &amp; more.</p><p>Teamsters.</p></div>
+<div id="story_content"><h1>Headline {i}</h1></div><div id="story_text"><div class="story_summary"><p>Summary {i}</p></div></div>
+<div id="transcript"><p>AMY GOODMAN: Welcome.</p><p>Goodbye.</p></div>{filler}</body></html>""".encode("utf-8")
+
+
+def safe_call(func, html):
+    try:
+        return func(html)
+    except Exception as e:
+        return type(e).__name__
+
+
+def time_pages(func, pages, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for html in pages:
+            safe_call(func, html)
+    return (time.perf_counter() - start) / (repeats * len(pages))
+
+
+def main(pages_glob, repeats, backend="html.parser"):
+    extract.backend = backend
+    if pages_glob:
+        pages = []
+        for path in sorted(glob.glob(pages_glob, recursive=True)):
+            with open(path, "rb") as fp:
+                pages.append(fp.read())
+    else:
+        pages = [synthetic_page(i) for i in range(20)]
+    print(f"{len(pages)} pages, {repeats} repeats")
+    for site, (full_parse, parse) in sites.items():
+        mismatches = sum(safe_call(full_parse, html) != safe_call(parse, html) for html in pages)
+        full_time = time_pages(full_parse, pages, repeats)
+        fast_time = time_pages(parse, pages, repeats)
+        print(f"{site}: full parse {1000*full_time:.2f} ms/page, restricted parse {1000*fast_time:.2f} ms/page, "
+              f"{full_time/fast_time:.1f}x faster, {mismatches} mismatches")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare restricted article parsing against full-page parsing.")
+    parser.add_argument("--pages", default=None, help="glob of saved pages to use, e.g. 'cache/**/*.body'")
+    parser.add_argument("--repeats", type=int, default=3, help="times each page is parsed")
+    extract.add_arguments(parser)
+    args = parser.parse_args()
+    main(args.pages, args.repeats, args.parser)
@@ -1,93 +1,101 @@
-import xml.etree.ElementTree as ET
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+import crawl_state
+import extract
+import fetch
+import pipeline
+import sitemaps
 
 
-def get_urls(m):
-    urls = []
-    dates = []
+def get_sitemap_urls(m):
+    sitemap_urls = []
     for d in range(1, 32):
         month = "0" + str(m)
         day = "0" + str(d)
-        sitemap_url = f"https://www.breitbart.com/sitemap_news-2023-{month[-2:]}-{day[-2:]}.xml"
-        temp_urls, temp_dates = parse_sitemap(sitemap_url)
-        urls.extend(temp_urls)
-        dates.extend(temp_dates)
+        sitemap_urls.append(f"https://www.breitbart.com/sitemap_news-2023-{month[-2:]}-{day[-2:]}.xml")
+    return sitemap_urls
+
+def keep_entry(entry):
+    """Keep 2023 articles outside of the sections we do not study."""
+    loc = entry["loc"]
+    if "/sports/" in loc or "/clips/" in loc or "/europe/" in loc or "/asia/" in loc or "/middle-east/" in loc:
+        return False
+    return '2023' in entry["publication_date"]
+
+def iter_urls(m, workers=8, state=None):
+    """
+    Yield the (url, date) of each article of month m as the day sitemaps are
+    read, only the new or modified ones given a crawl state.
+    """
+    for entry in sitemaps.discover(get_sitemap_urls(m), keep_entry, workers, state):
+        yield entry["loc"], entry["publication_date"]
+
+def get_urls(m):
+    urls = []
+    dates = []
+    for url, date in iter_urls(m):
+        urls.append(url)
+        dates.append(date)
     return urls, dates
 
 def parse_sitemap(sitemap_url):
     """Parse the sitemap and return a list of article URLs for a specific year."""
-    response = requests.get(sitemap_url)
-    sitemap_content = response.text
-    root = ET.fromstring(sitemap_content)
-
     urls = []
     dates = []
-    for url_tag in root.findall('{http://www.sitemaps.org/schemas/sitemap/0.9}url'):
-        loc = url_tag.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc').text
-        publication_date = url_tag.find('{http://www.google.com/schemas/sitemap-news/0.9}news').find('{http://www.google.com/schemas/sitemap-news/0.9}publication_date').text
+    for entry in sitemaps.iter_entries(sitemap_url):
+        if keep_entry(entry):
+            urls.append(entry["loc"])
+            dates.append(entry["publication_date"])
+    return urls, dates
 
-        if "/sports/" in loc or "/clips/" in loc or "/europe/" in loc or "/asia/" in loc or "/middle-east/" in loc:
-            continue
 
-        if '2023' in publication_date:
-            urls.append(loc)
-            dates.append(publication_date)
+# Where Breitbart keeps the title and content of an article
+article_spec = {
+    # First <h1> tag in <section> with id "MainW"
+    "title": {"path": [("section", {"id": "MainW"}), ("h1", {})], "missing": "No title found"},
+    "content": [
+        # <p> tags inside first <div> with class "entry-content" in <section> with id "MainW"
+        {"path": [("section", {"id": "MainW"}), ("div", {"class": "entry-content"})],
+         "paragraphs": True, "missing": "No content found"}
+    ]
+}
+article_strainer = extract.get_strainer(article_spec)
 
-    return urls, dates
+
+def parse_article(html):
+    """Return the title and content of a Breitbart article page."""
+    return extract.extract(article_spec, html, article_strainer)
 
 
 def scrape(url):
     """Scrape a single article from Washington Examiner and return its title and content."""
     try:
-        response = requests.get(url)
+        response = fetch.get(url)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Extracting title: first <h1> tag in <section> with id "MainW"
-        title_tag = soup.find('section', id='MainW').find('h1')
-        title = title_tag.get_text().strip() if title_tag else 'No title found'
-
-        # Extracting content: in <p> tags inside first <div> with class "entry-content" in <section> with id "MainW"
-        content_tag = soup.find('section', id='MainW').find('div', class_='entry-content')
-        content = ' '.join(p.get_text().strip() for p in content_tag.find_all('p')) if content_tag else 'No content found'
-
-        return title, content
+        return parse_article(response.content)
 
     except Exception as e:
         print(f"Error scraping {url}: {str(e)}")
         return None, None
 
 
-def main():
+def get_adapter(m, workers=8):
+    """Plug month m of Breitbart into the scraping pipeline."""
+    output = f"output/breitbart{str(m)}.csv"
+    state = crawl_state.get_state(output)
+    return {
+        "name": "Breitbart month " + str(m),
+        "domain": "breitbart",
+        "output": output,
+        "entries": iter_urls(m, workers, state),
+        "parse": parse_article,
+        "state": state
+    }
+
+
+def main(workers=8, parse_workers=2, queue_size=100, report_every=10):
     for m in range(11, 13):
-        df = {
-            "url": [],
-            "date": [],
-            "title": [],
-            "content": [],
-            "domain": []
-        }
-        urls, dates = get_urls(m)
-        N = len(urls)
-        print("Month: " + str(m) + " - " + str(N) + " articles")
-        interval = N // 10
-        for i in range(len(urls)):
-            title, content = scrape(urls[i])
-            if title is None or content is None:
-                continue
-            df["url"].append(urls[i])
-            df["date"].append(dates[i])
-            df["title"].append(title)
-            df["content"].append(content)
-            df["domain"].append("breitbart")
-            if i % interval == 0:
-                print(f"{round(100*i/N, 2)}% done!")
-        print("All done!")
-        df = pd.DataFrame(df)
-        df.to_csv(f"output/breitbart{str(m)}.csv")
-        del df
+        pipeline.run(get_adapter(m, workers), workers, parse_workers, queue_size, report_every)
+    print("All done!")
 
 if __name__ == "__main__":
-    main()
+    args = pipeline.parse_args("Scrape Breitbart articles.")
+    main(args.workers, args.parse_workers, args.queue_size, args.report_every)
@@ -0,0 +1,116 @@
+import csv
+import os
+import sys
+
+columns = ["url", "date", "title", "content", "domain"]
+
+
+class ScrapeOutput:
+    """
+    Append scraped rows to a CSV file as they are produced and record each
+    finished url in a checkpoint file next to it, so a restarted run can skip
+    the urls already scraped.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.done_path = output_path + ".done"
+        self.done = set()
+        # Urls written by this run, as opposed to earlier ones
+        self.written = set()
+        if os.path.exists(self.done_path):
+            with open(self.done_path, encoding="utf-8") as fp:
+                self.done = set(line.rstrip("\n") for line in fp if line.strip())
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        if not new_file:
+            check_header(output_path)
+        self.output_file = open(output_path, "a", newline="", encoding="utf-8")
+        self.done_file = open(self.done_path, "a", encoding="utf-8")
+        self.writer = csv.DictWriter(self.output_file, fieldnames=columns)
+        if new_file:
+            self.writer.writeheader()
+            self.output_file.flush()
+
+    def todo(self, entries, refetch=()):
+        """
+        Yield the (url, date) entries not yet scraped, or in refetch, skipping
+        repeated urls.
+        """
+        seen = set()
+        for entry in entries:
+            if (entry[0] in self.done and entry[0] not in refetch) or entry[0] in seen:
+                continue
+            seen.add(entry[0])
+            yield entry
+
+    def write(self, row):
+        """Write a scraped row and mark its url as done."""
+        self.writer.writerow(row)
+        self.output_file.flush()
+        self.done_file.write(row["url"] + "\n")
+        self.done_file.flush()
+        self.done.add(row["url"])
+        self.written.add(row["url"])
+
+    def close(self):
+        self.output_file.close()
+        self.done_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def check_header(output_path):
+    """
+    Make sure rows can be appended to an existing scrape output. Outputs of
+    the old scrapers start with a pandas index column; they are rewritten
+    without it. Any other header is an error, since appended rows would not
+    line up with it.
+    """
+    csv.field_size_limit(sys.maxsize)
+    with open(output_path, newline="", encoding="utf-8") as fp:
+        header = next(csv.reader(fp), [])
+    if header == columns:
+        return
+    if header != [""] + columns:
+        raise ValueError(f"{output_path} has columns {header}, expected {columns}; move it aside to scrape again")
+    temp_path = output_path + ".tmp"
+    with open(output_path, newline="", encoding="utf-8") as source, \
+            open(temp_path, "w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        for row in csv.reader(source):
+            writer.writerow(row[1:])
+    os.replace(temp_path, output_path)
+    print(f"Removed the index column of {output_path}")
+
+
+def compact(output_path):
+    """
+    Rewrite a scrape output so each url has a single row, the last one
+    written. The file is streamed twice, first to find the last row of each
+    url and then to copy those rows, so article bodies are never all held in
+    memory. Return the number of rows dropped.
+    """
+    csv.field_size_limit(sys.maxsize)
+    last = {}
+    num_rows = 0
+    with open(output_path, newline="", encoding="utf-8") as fp:
+        for number, row in enumerate(csv.DictReader(fp)):
+            last[row["url"]] = number
+            num_rows += 1
+    if len(last) == num_rows:
+        return 0
+    keep = set(last.values())
+    temp_path = output_path + ".tmp"
+    with open(output_path, newline="", encoding="utf-8") as source, \
+            open(temp_path, "w", newline="", encoding="utf-8") as fp:
+        writer = csv.DictWriter(fp, fieldnames=columns)
+        writer.writeheader()
+        for number, row in enumerate(csv.DictReader(source)):
+            if number in keep:
+                writer.writerow(row)
+    os.replace(temp_path, output_path)
+    return num_rows - len(last)
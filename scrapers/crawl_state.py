@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+
+# Whether the scrapers only fetch articles that are new or modified since the
+# last run, according to the sitemaps' <lastmod>
+delta = True
+
+
+def add_arguments(parser):
+    """Add the delta crawling options to a scraper's argument parser."""
+    parser.add_argument("--full-crawl", dest="delta", action="store_false",
+                        help="ignore the saved <lastmod> state and consider every article in the sitemaps")
+
+
+def configure_from_args(args):
+    """Configure delta crawling from parsed scraper arguments."""
+    global delta
+    delta = args.delta
+
+
+class CrawlState:
+    """
+    The <lastmod> last seen for each scraped url and, for each sitemap, the
+    newest <lastmod> in it and whether every article it listed was scraped.
+    Both are kept next to a scraper's output file.
+
+    A url is new if it has no saved <lastmod> and modified if its <lastmod>
+    changed. A complete sitemap that the HTTP cache reports as unchanged
+    cannot hold anything new, so it is not parsed again.
+    """
+
+    def __init__(self, output_path):
+        self.urls_path = output_path + ".lastmod"
+        self.sitemaps_path = output_path + ".sitemaps.json"
+        self.lastmod = {}
+        if os.path.exists(self.urls_path):
+            with open(self.urls_path, encoding="utf-8") as fp:
+                for line in fp:
+                    url, _, lastmod = line.rstrip("\n").partition("\t")
+                    if url:
+                        self.lastmod[url] = lastmod or None
+        self.sitemaps = {}
+        if os.path.exists(self.sitemaps_path):
+            with open(self.sitemaps_path, encoding="utf-8") as fp:
+                self.sitemaps = json.load(fp)
+        # What this run found: url -> (lastmod, sitemap), the sitemaps read
+        # to the end, and the newest <lastmod> in each
+        self.pending = {}
+        self.read = set()
+        self.unchanged = set()
+        self.newest = {}
+        self.modified = set()
+        self.counts = {"new": 0, "modified": 0, "unchanged": 0}
+        self.lock = threading.Lock()
+
+    def sitemap_complete(self, sitemap_url):
+        """Return whether every article listed by a sitemap was scraped in an earlier run."""
+        return self.sitemaps.get(sitemap_url, {}).get("complete", False)
+
+    def sitemap_read(self, sitemap_url):
+        """Record that a sitemap was read to the end, or found unchanged."""
+        with self.lock:
+            self.read.add(sitemap_url)
+
+    def sitemap_unchanged(self, sitemap_url):
+        """Record that a complete sitemap was found unchanged and skipped."""
+        with self.lock:
+            self.unchanged.add(sitemap_url)
+
+    def changed(self, entry, sitemap_url):
+        """Return whether a sitemap entry is new or modified, and remember it if so."""
+        url, lastmod = entry["loc"], entry["lastmod"]
+        with self.lock:
+            if lastmod is not None and lastmod > self.newest.get(sitemap_url, ""):
+                self.newest[sitemap_url] = lastmod
+            if url not in self.lastmod:
+                kind = "new"
+            elif lastmod is not None and lastmod != self.lastmod[url]:
+                kind = "modified"
+                self.modified.add(url)
+            else:
+                self.counts["unchanged"] += 1
+                return False
+            self.counts[kind] += 1
+            self.pending[url] = (lastmod, sitemap_url)
+            return True
+
+    def save(self, is_done):
+        """
+        Save the <lastmod> of the urls found this run for which is_done(url)
+        is true, and mark the sitemaps read this run complete if all their
+        urls are done.
+        """
+        missing = set()
+        with open(self.urls_path, "a", encoding="utf-8") as fp:
+            for url, (lastmod, sitemap_url) in self.pending.items():
+                if is_done(url):
+                    fp.write(url + "\t" + (lastmod or "") + "\n")
+                    self.lastmod[url] = lastmod
+                else:
+                    missing.add(sitemap_url)
+        for sitemap_url in self.read:
+            previous = self.sitemaps.get(sitemap_url, {})
+            self.sitemaps[sitemap_url] = {
+                "newest": max(self.newest.get(sitemap_url, ""), previous.get("newest") or "") or None,
+                "complete": sitemap_url not in missing
+            }
+        temp_path = self.sitemaps_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as fp:
+            json.dump(self.sitemaps, fp, indent=1)
+        os.replace(temp_path, self.sitemaps_path)
+        self.pending = {}
+
+    def summary(self):
+        return (f"{self.counts['new']} new, {self.counts['modified']} modified and "
+                f"{self.counts['unchanged']} unchanged articles, "
+                f"{len(self.unchanged)} of {len(self.read)} sitemaps skipped as unchanged")
+
+
+def get_state(output_path):
+    """Return the crawl state of a scraper output, or None when delta crawling is off."""
+    return CrawlState(output_path) if delta else None
@@ -1,86 +1,91 @@
-import xml.etree.ElementTree as ET
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+import crawl_state
+import extract
+import fetch
+import pipeline
+import sitemaps
 
 def get_urls_dn():
+    urls = []
+    dates = []
+    for url, date in iter_urls_dn():
+        urls.append(url)
+        dates.append(date)
+    return urls, dates
+
+
+def keep_entry_dn(entry):
+    """Keep the stories from 2023."""
+    return '2023' in entry["loc"] and '2023' in entry["lastmod"]
+
+
+def iter_urls_dn(state=None):
+    """
+    Yield the (url, date) of each 2023 story as the sitemap is read, only the
+    new or modified ones given a crawl state.
+    """
     sitemap_url = 'https://www.democracynow.org/sitemap_story.xml'
-    return parse_sitemap_dn(sitemap_url)
+    for entry in sitemaps.discover([sitemap_url], keep_entry_dn, state=state):
+        yield entry["loc"], entry["lastmod"]
 
 
 def parse_sitemap_dn(sitemap_url):
     """
     Parse the sitemap and return a list of article URLs for 2023.
     """
-    response = requests.get(sitemap_url)
-    sitemap_content = response.text
-    root = ET.fromstring(sitemap_content)
     urls = []
     dates = []
-    for url_tag in root.findall('{http://www.sitemaps.org/schemas/sitemap/0.9}url'):
-        loc = url_tag.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc').text
-        lastmod = url_tag.find('{http://www.sitemaps.org/schemas/sitemap/0.9}lastmod').text
-
-        if '2023' in loc and '2023' in lastmod:
-            urls.append(loc)
-            dates.append(lastmod)
-
+    for entry in sitemaps.iter_entries(sitemap_url):
+        if keep_entry_dn(entry):
+            urls.append(entry["loc"])
+            dates.append(entry["lastmod"])
     return urls, dates
 
 
-def scrape_dn(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+# Where Democracy Now keeps the title and content of a story
+article_spec_dn = {
+    "title": {"path": [("div", {"id": "story_content"}), ("h1", {})], "missing": "No title found"},
+    "content": [
+        # Story summary
+        {"path": [("div", {"id": "story_text"}), ("div", {"class": "story_summary"}), ("p", {})],
+         "missing": "No summary found"},
+        # Transcript
+        {"path": [("div", {"id": "transcript"})], "paragraphs": True, "missing": "No transcript found"}
+    ]
+}
+article_strainer_dn = extract.get_strainer(article_spec_dn)
 
-        # Extracting title
-        title_tag = soup.find('div', id='story_content').find('h1')
-        title = title_tag.get_text().strip() if title_tag else 'No title found'
 
-        # Extracting story summary
-        summary_tag = soup.find('div', id='story_text').find('div', class_='story_summary').find('p')
-        story_summary = summary_tag.get_text().strip() if summary_tag else 'No summary found'
+def parse_article_dn(html):
+    """Return the title and content of a Democracy Now story page."""
+    return extract.extract(article_spec_dn, html, article_strainer_dn)
 
-        # Extracting transcript
-        transcript_tag = soup.find('div', id='transcript')
-        transcript = ' '.join(p.get_text().strip() for p in transcript_tag.find_all('p')) if transcript_tag else 'No transcript found'
 
-        content = story_summary + " " + transcript
-
-        return title, content
+def scrape_dn(url):
+    try:
+        response = fetch.get(url)
+        response.raise_for_status()
+        return parse_article_dn(response.content)
 
     except Exception as e:
         return None, None
 
-def main():
-    data = {
-        "url": [],
-        "date": [],
-        "title": [],
-        "content": [],
-        "domain": []
+def get_adapter_dn(workers=8):
+    """Plug Democracy Now into the scraping pipeline."""
+    output = "output/democracynow.csv"
+    state = crawl_state.get_state(output)
+    return {
+        "name": "Democracy Now",
+        "domain": "democracynow",
+        "output": output,
+        "entries": iter_urls_dn(state),
+        "parse": parse_article_dn,
+        "state": state
     }
-    urls, dates = get_urls_dn()
-    N = len(urls)
-    print(N)
-    interval = N // 10
-    for i in range(len(urls)):
-        title, content = scrape_dn(urls[i])
-        if title is None or content is None:
-            continue
-        data["url"].append(urls[i])
-        data["date"].append(dates[i])
-        data["title"].append(title)
-        data["content"].append(content)
-        data["domain"].append("democracynow")
-        if i % interval == 0:
-            print(f"{round(100*i/N, 2)}% done!")
-    print("All done!")
-    df = pd.DataFrame(data)
-    df.to_csv("output/democracynow.csv")
-
 
+def main(workers=8, parse_workers=2, queue_size=100, report_every=10):
+    pipeline.run(get_adapter_dn(workers), workers, parse_workers, queue_size, report_every)
+    print("All done!")
 
 if __name__ == "__main__":
-    main()
+    args = pipeline.parse_args("Scrape Democracy Now articles.")
+    main(args.workers, args.parse_workers, args.queue_size, args.report_every)
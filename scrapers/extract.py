@@ -0,0 +1,93 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Parser backend used for article pages. "lxml" is faster if it is installed.
+backend = "html.parser"
+
+# An article spec says where a site keeps its title and content:
+#   {"title": field, "content": [field, ...]}
+# A field is a path of (tag name, attributes) steps, each searched for inside
+# the previous one, as soup.find(...).find(...) would. Every step but the last
+# must be found. If the last is missing, the field's "missing" text is used.
+# With "paragraphs", the text of the <p> tags inside the element is joined
+# instead of taking the element's own text. The content is its fields joined
+# with spaces.
+
+
+def add_arguments(parser):
+    """Add the extraction options to a scraper's argument parser."""
+    parser.add_argument("--parser", default=backend, help="BeautifulSoup parser backend for article pages, e.g. lxml")
+
+
+def configure_from_args(args):
+    """Configure the extraction from parsed scraper arguments."""
+    configure(args.parser)
+
+
+def configure(parser_backend):
+    """
+    Set the parser backend. Parse processes run this as their initializer,
+    since they only inherit module settings when the pool forks.
+    """
+    global backend
+    backend = parser_backend
+
+
+def step_matches(step, name, attrs):
+    """Return whether a start tag matches a path step."""
+    step_name, step_attrs = step
+    if name != step_name:
+        return False
+    for key, value in step_attrs.items():
+        actual = attrs.get(key)
+        if actual is None:
+            return False
+        if key == "class":
+            if value not in actual.split():
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def get_strainer(spec):
+    """
+    Return a strainer keeping only the elements that start a field's path, so
+    the rest of the page is never turned into a tree.
+    """
+    roots = [field["path"][0] for field in [spec["title"]] + spec["content"]]
+
+    def keep(name, attrs=None):
+        # Without attributes we cannot tell, so keep the tag to stay correct
+        if attrs is None:
+            return True
+        if not isinstance(attrs, dict):
+            attrs = dict(attrs)
+        return any(step_matches(root, name, attrs) for root in roots)
+
+    return SoupStrainer(keep)
+
+
+def get_field(soup, field):
+    """Return the text of a field, raising AttributeError if its path is broken."""
+    tag = soup
+    for step in field["path"][:-1]:
+        tag = tag.find(step[0], attrs=step[1])
+        if tag is None:
+            raise AttributeError(f"no <{step[0]} {step[1]}> on the page")
+    step = field["path"][-1]
+    tag = tag.find(step[0], attrs=step[1])
+    if tag is None:
+        return field["missing"]
+    if field.get("paragraphs"):
+        return ' '.join(p.get_text().strip() for p in tag.find_all('p'))
+    return tag.get_text().strip()
+
+
+def extract(spec, html, strainer=None):
+    """Extract the title and content of an article page."""
+    if strainer is None:
+        strainer = get_strainer(spec)
+    soup = BeautifulSoup(html, backend, parse_only=strainer)
+    title = get_field(soup, spec["title"])
+    content = " ".join(get_field(soup, field) for field in spec["content"])
+    return title, content
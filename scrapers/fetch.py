@@ -0,0 +1,211 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import http_cache
+import rate
+import telemetry
+
+# Most requests allowed in flight to a single host, times a throttled
+# request is retried, and the request timeout in seconds
+max_per_host = 4
+max_retries = 5
+timeout = 30
+# Whether responses are cached on disk, and how many seconds a cached
+# response is used before it is revalidated with the server
+use_cache = True
+cache_ttl = 0
+
+_local = threading.local()
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def configure(per_host=None, request_timeout=None, cache=None, ttl=None, retries=None):
+    """Set the per-host request limit, the request timeout, retries and the cache policy."""
+    global max_per_host, timeout, use_cache, cache_ttl, max_retries
+    with _controllers_lock:
+        if per_host is not None:
+            max_per_host = per_host
+            _controllers.clear()
+        if request_timeout is not None:
+            timeout = request_timeout
+        if cache is not None:
+            use_cache = cache
+        if ttl is not None:
+            cache_ttl = ttl
+        if retries is not None:
+            max_retries = retries
+
+
+def add_arguments(parser):
+    """Add the fetch engine options to a scraper's argument parser."""
+    parser.add_argument("--workers", type=int, default=8, help="number of articles fetched at once")
+    parser.add_argument("--per-host", type=int, default=max_per_host, help="most requests in flight per host")
+    parser.add_argument("--retries", type=int, default=max_retries, help="times a throttled or failed request is retried")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="do not use the on-disk response cache")
+    parser.add_argument("--cache-ttl", type=float, default=cache_ttl,
+                        help="seconds a cached response is used before it is revalidated")
+    parser.add_argument("--offline", action="store_true", help="use cached responses without revalidating them")
+
+
+def configure_from_args(args):
+    """Configure the fetch engine from parsed scraper arguments."""
+    ttl = float("inf") if args.offline else args.cache_ttl
+    configure(per_host=args.per_host, cache=args.cache, ttl=ttl, retries=args.retries)
+
+
+def get_session():
+    """Return this thread's keep-alive session, creating it on first use."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_per_host)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def get_controller(url):
+    """Return the rate controller of the url's host."""
+    host = urlsplit(url).netloc
+    with _controllers_lock:
+        if host not in _controllers:
+            _controllers[host] = rate.HostController(max_per_host)
+        return _controllers[host]
+
+
+def send(url, **kwargs):
+    """
+    GET a url once its host's rate controller allows it. Throttled responses
+    and connection errors are retried up to max_retries times, after the pause
+    the controller sets; the last response or error is returned or raised.
+    Any other request error frees the host's slot and is raised at once.
+    """
+    response, _ = send_held(url, False, **kwargs)
+    return response
+
+
+def send_held(url, hold=True, **kwargs):
+    """
+    Send a request like send, and return the response and a function that
+    frees the host's slot. With hold, the slot stays taken until the caller
+    calls it once the body has been read or the response closed, so a
+    streamed download counts towards the host's limit and its latency;
+    without, the slot is already free and the function does nothing.
+    """
+    controller = get_controller(url)
+    for attempt in range(max_retries + 1):
+        controller.acquire()
+        start = time.monotonic()
+        try:
+            response = get_session().get(url, **kwargs)
+        except requests.RequestException as e:
+            controller.release(None, time.monotonic() - start)
+            telemetry.record_error(url, e)
+            if attempt == max_retries or not isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                raise
+            continue
+        retry_after = rate.parse_retry_after(response.headers.get("Retry-After"))
+
+        def release():
+            latency = time.monotonic() - start
+            controller.release(response.status_code, latency, retry_after)
+            telemetry.record_response(url, response.status_code, latency)
+            telemetry.metrics.set("scraper_host_limit", controller.limit, host=telemetry.host_of(url))
+
+        if response.status_code not in rate.throttle_statuses or attempt == max_retries:
+            if hold:
+                return response, release
+            release()
+            return response, lambda: None
+        release()
+        response.close()
+
+
+def check_cache(url, kwargs, with_body=True):
+    """
+    Look a url up in the cache. Return the cache entry, or None, and whether
+    it is fresh. A stale entry adds its revalidation headers to kwargs.
+    """
+    entry = http_cache.load(url, with_body) if use_cache else None
+    if entry is None:
+        return None, False
+    meta, _ = entry
+    if http_cache.is_fresh(meta, cache_ttl):
+        return entry, True
+    headers = dict(kwargs.get("headers") or {})
+    headers.update(http_cache.conditional_headers(meta))
+    kwargs["headers"] = headers
+    return entry, False
+
+
+def get(url, **kwargs):
+    """
+    GET a url on a pooled session at the pace its host allows.
+
+    With the cache on, a fresh cached response is returned without touching
+    the network and a stale one is revalidated with a conditional request.
+    """
+    kwargs.setdefault("timeout", timeout)
+    entry, fresh = check_cache(url, kwargs)
+    if fresh:
+        telemetry.record_cache(url, "hit")
+        return http_cache.to_response(url, *entry)
+    response = send(url, **kwargs)
+    telemetry.record_bytes(url, len(response.content))
+    if use_cache:
+        if response.status_code == 304 and entry is not None:
+            telemetry.record_cache(url, "revalidated")
+            http_cache.touch(url, entry[0])
+            return http_cache.to_response(url, *entry)
+        telemetry.record_cache(url, "miss")
+        if response.status_code == 200:
+            http_cache.store(url, response.headers, response.content)
+    return response
+
+
+def iter_content(url, chunk_size=1 << 16, on_unchanged=None, **kwargs):
+    """
+    GET a url like get, but yield the body in chunks as it arrives. Raises
+    for error statuses.
+
+    If on_unchanged is given and the cache shows the body has not changed,
+    on_unchanged() is called instead of yielding the cached body. The host's
+    request slot is held until the body has been read or the generator closed.
+    """
+    kwargs.setdefault("timeout", timeout)
+    entry, fresh = check_cache(url, kwargs, with_body=False)
+    if fresh:
+        telemetry.record_cache(url, "hit")
+        if on_unchanged is not None:
+            on_unchanged()
+            return
+        yield from http_cache.iter_body(url, chunk_size)
+        return
+    response, release = send_held(url, stream=True, **kwargs)
+    try:
+        if response.status_code == 304 and entry is not None:
+            telemetry.record_cache(url, "revalidated")
+            http_cache.touch(url, entry[0])
+            if on_unchanged is not None:
+                on_unchanged()
+                return
+            yield from http_cache.iter_body(url, chunk_size)
+            return
+        if use_cache:
+            telemetry.record_cache(url, "miss")
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size)
+        if use_cache:
+            # The body goes to a temporary cache file as it arrives, never to memory as a whole
+            chunks = http_cache.store_chunks(url, response.headers, chunks)
+        for chunk in chunks:
+            telemetry.record_bytes(url, len(chunk))
+            yield chunk
+    finally:
+        response.close()
+        release()
+
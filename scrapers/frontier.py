@@ -0,0 +1,219 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# Seconds a worker may hold a leased url before another worker can take it
+lease_ttl = 600
+# Times a url is handed out again after failing before it is given up on
+max_attempts = 3
+# SQLite journal mode. WAL lets readers and the writer work at the same time
+# but needs every process on the same machine; use "delete" when the file
+# is shared over a network filesystem
+journal_mode = "wal"
+
+# Folder of the shared frontiers, None to scrape without one, what this
+# process does with them and the name its leases are held under
+folder = None
+role = "both"
+worker = None
+
+schema = """
+create table if not exists urls (
+    url text primary key,
+    date text,
+    state text not null default 'todo',
+    worker text,
+    lease_expires real,
+    attempts integer not null default 0,
+    error text,
+    lastmod text
+);
+create index if not exists urls_state on urls (state, lease_expires);
+"""
+
+
+def default_worker():
+    """Name this process so its leases can be told apart from other workers'."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def add_arguments(parser):
+    """Add the frontier options to a scraper's argument parser."""
+    parser.add_argument("--frontier", default=None,
+                        help="folder of shared url frontiers; without it each run scrapes on its own")
+    parser.add_argument("--role", choices=["discover", "work", "both"], default="both",
+                        help="fill the frontier, scrape urls leased from it, or both in turn")
+    parser.add_argument("--worker-id", default=None, help="name of this worker, hostname-pid by default")
+    parser.add_argument("--lease-ttl", type=float, default=lease_ttl,
+                        help="seconds before a url leased by a stalled worker is handed out again")
+    parser.add_argument("--no-wal", dest="wal", action="store_false",
+                        help="do not use WAL mode, for frontiers shared over a network filesystem")
+
+
+def configure_from_args(args):
+    """Configure the frontiers from parsed scraper arguments."""
+    global folder, role, worker, lease_ttl, journal_mode
+    folder = args.frontier
+    role = args.role
+    worker = args.worker_id
+    lease_ttl = args.lease_ttl
+    if not args.wal:
+        journal_mode = "delete"
+
+
+def frontier_path(frontier_folder, output_path):
+    """Return the frontier file of a scraper output inside a frontier folder."""
+    name = os.path.splitext(os.path.basename(output_path))[0]
+    return os.path.join(frontier_folder, name + ".frontier.db")
+
+
+def worker_output(output_path, worker_name):
+    """Return the output file a worker writes its share of a scrape to."""
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}-{worker_name}{ext}"
+
+
+class Frontier:
+    """
+    A durable queue of urls to scrape, kept in a SQLite file that any number
+    of processes can share. Discovery adds urls; workers lease batches of
+    them and mark each one done or failed. A lease that is not finished in
+    time, because its worker died, expires and the url is handed out again.
+    """
+
+    def __init__(self, path, worker_name=None):
+        self.path = path
+        self.worker = worker_name or worker or default_worker()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # Statements run in autocommit mode; writes that must see a consistent
+        # table take the write lock with "begin immediate"
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute(f"pragma journal_mode={journal_mode}")
+        self.connection.execute("pragma synchronous=normal")
+        self.connection.executescript(schema)
+        # Frontiers made before the sitemap <lastmod> was kept lack its column
+        if "lastmod" not in [row[1] for row in self.connection.execute("pragma table_info(urls)")]:
+            self.connection.execute("alter table urls add column lastmod text")
+        self.lock = threading.Lock()
+
+    def transaction(self, statements):
+        """Run statements(cursor) in one write transaction and return its result."""
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("begin immediate")
+            try:
+                result = statements(cursor)
+            except BaseException:
+                cursor.execute("rollback")
+                raise
+            cursor.execute("commit")
+            return result
+
+    def add(self, entries, lastmods=None, batch_size=1000):
+        """
+        Add (url, date) entries, skipping urls already known. Return the
+        number added or queued again. lastmods maps the urls that delta
+        crawling found new or modified to their sitemap <lastmod>; a known
+        url among them is scraped again if its <lastmod> changed or it had
+        failed, unless a worker holds it right now.
+        """
+        lastmods = lastmods or {}
+        added = 0
+        batch = []
+        requeue = []
+
+        def insert(cursor):
+            before = self.connection.total_changes
+            cursor.executemany("insert or ignore into urls (url, date, lastmod) values (?, ?, ?)", batch)
+            # Urls inserted just now already have their <lastmod> and are left alone
+            cursor.executemany("update urls set state = 'todo', attempts = 0, error = null, worker = null, "
+                               "lease_expires = null, lastmod = ? "
+                               "where url = ? and state != 'leased' and (lastmod is not ? or state = 'failed')",
+                               [(lastmods[url], url, lastmods[url]) for url in requeue])
+            return self.connection.total_changes - before
+
+        for entry in entries:
+            batch.append((entry[0], entry[1], lastmods.get(entry[0])))
+            if entry[0] in lastmods:
+                requeue.append(entry[0])
+            if len(batch) >= batch_size:
+                added += self.transaction(insert)
+                batch = []
+                requeue = []
+        if batch:
+            added += self.transaction(insert)
+        return added
+
+    def recover(self, cursor, now):
+        """Hand the urls of expired leases out again."""
+        cursor.execute("update urls set state = 'todo', worker = null, lease_expires = null "
+                       "where state = 'leased' and lease_expires < ?", (now,))
+
+    def lease(self, batch_size=100, ttl=None):
+        """Lease up to batch_size urls to this worker. Return their (url, date) entries."""
+        ttl = lease_ttl if ttl is None else ttl
+
+        def take(cursor):
+            now = time.time()
+            self.recover(cursor, now)
+            rows = cursor.execute("select url, date from urls where state = 'todo' order by rowid limit ?",
+                                  (batch_size,)).fetchall()
+            cursor.executemany("update urls set state = 'leased', worker = ?, lease_expires = ? where url = ?",
+                               [(self.worker, now + ttl, url) for url, _ in rows])
+            return rows
+
+        return self.transaction(take)
+
+    def complete(self, url):
+        """Mark a leased url as scraped."""
+        with self.lock:
+            self.connection.execute("update urls set state = 'done', lease_expires = null, error = null "
+                                    "where url = ?", (url,))
+
+    def fail(self, url, error):
+        """
+        Record that scraping a leased url failed. It is handed out again until
+        it has failed max_attempts times.
+        """
+        with self.lock:
+            self.connection.execute(
+                "update urls set attempts = attempts + 1, error = ?, lease_expires = null, "
+                "state = case when attempts + 1 >= ? then 'failed' else 'todo' end, "
+                "worker = null where url = ?", (str(error), max_attempts, url))
+
+    def done_urls(self, lastmods, batch_size=500):
+        """
+        Return the urls of lastmods that were scraped after being found with
+        the <lastmod> lastmods gives them.
+        """
+        items = list(lastmods.items())
+        done = set()
+        with self.lock:
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                rows = self.connection.execute(
+                    "select url, lastmod from urls where state = 'done' and url in (" +
+                    ",".join("?" * len(batch)) + ")", [url for url, _ in batch])
+                done.update(url for url, lastmod in rows if lastmod == lastmods[url])
+        return done
+
+    def counts(self):
+        """Return the number of urls in each state."""
+        with self.lock:
+            rows = self.connection.execute("select state, count(*) from urls group by state").fetchall()
+        counts = {"todo": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(rows)
+        return counts
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
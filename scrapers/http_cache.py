@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+cache_dir = "cache/"
+
+# Response headers kept with a cached body
+kept_headers = ["Content-Type", "ETag", "Last-Modified"]
+
+
+def entry_paths(url):
+    """Return the body and metadata paths of a url's cache entry."""
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    folder = os.path.join(cache_dir, key[:2])
+    return os.path.join(folder, key + ".body"), os.path.join(folder, key + ".json")
+
+
+def temp_path_of(path):
+    """Return a temporary path next to path, unique to this thread."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def write_atomic(path, data):
+    """Write bytes to a path so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = temp_path_of(path)
+    with open(temp_path, "wb") as fp:
+        fp.write(data)
+    os.replace(temp_path, path)
+
+
+def load(url, with_body=True):
+    """
+    Return the (metadata, body) cached for a url, or None. Without with_body
+    the body is left on disk and None is returned in its place.
+    """
+    body_path, meta_path = entry_paths(url)
+    try:
+        with open(meta_path, encoding="utf-8") as fp:
+            meta = json.load(fp)
+        if not with_body:
+            return meta, None
+        with open(body_path, "rb") as fp:
+            body = fp.read()
+    except (OSError, ValueError):
+        return None
+    return meta, body
+
+
+def new_meta(url, headers):
+    return {
+        "url": url,
+        "fetched_at": time.time(),
+        "headers": {name: headers[name] for name in kept_headers if name in headers}
+    }
+
+
+def store(url, headers, body):
+    """Cache the headers and body of a successful response."""
+    body_path, meta_path = entry_paths(url)
+    write_atomic(body_path, body)
+    write_atomic(meta_path, json.dumps(new_meta(url, headers)).encode("utf-8"))
+
+
+def store_chunks(url, headers, chunks):
+    """
+    Pass the chunks of a successful response body through, writing them to
+    a temporary file as they go. The file becomes the cache entry once every
+    chunk is written; if the caller stops early it is deleted.
+    """
+    body_path, meta_path = entry_paths(url)
+    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+    temp_path = temp_path_of(body_path)
+    try:
+        with open(temp_path, "wb") as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+                yield chunk
+        os.replace(temp_path, body_path)
+        write_atomic(meta_path, json.dumps(new_meta(url, headers)).encode("utf-8"))
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def iter_body(url, chunk_size):
+    """Yield the cached body of a url in chunks, reading it from disk as it goes."""
+    body_path, _ = entry_paths(url)
+    with open(body_path, "rb") as fp:
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def touch(url, meta):
+    """Mark a cache entry as revalidated now."""
+    _, meta_path = entry_paths(url)
+    meta["fetched_at"] = time.time()
+    write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+
+def is_fresh(meta, ttl):
+    """Return whether a cache entry is younger than ttl seconds."""
+    return time.time() - meta["fetched_at"] < ttl
+
+
+def conditional_headers(meta):
+    """Return the headers that revalidate a cache entry."""
+    headers = {}
+    if "ETag" in meta["headers"]:
+        headers["If-None-Match"] = meta["headers"]["ETag"]
+    if "Last-Modified" in meta["headers"]:
+        headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+    return headers
+
+
+def to_response(url, meta, body):
+    """Build a response object from a cache entry."""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(meta["headers"])
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    return response
@@ -0,0 +1,306 @@
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import checkpoint
+import crawl_state
+import extract
+import fetch
+import frontier
+import seen
+import telemetry
+
+# A site adapter plugs a scraper into the pipeline:
+#   {"name": ..., "domain": ..., "output": output csv path,
+#    "entries": iterator of (url, date), "parse": html -> (title, content),
+#    "state": crawl state of the output for delta crawling, or None}
+# "parse" must be a module-level function so it can be sent to the parse
+# processes.
+
+stage_names = ["discover", "fetch", "parse", "write"]
+
+# Put on a queue once per downstream thread when a stage has finished
+end = None
+
+# Urls leased from a frontier at a time, and seconds to wait before asking
+# again when the other workers hold all that is left
+lease_batch = 100
+lease_poll = 1.0
+
+
+def timed_parse(parse, html):
+    """Parse a page in a parse process, returning the result and the seconds it took."""
+    start = time.perf_counter()
+    result = parse(html)
+    return result, time.perf_counter() - start
+
+
+def add_arguments(parser):
+    """Add the pipeline options to a scraper's argument parser."""
+    parser.add_argument("--parse-workers", type=int, default=2, help="number of processes parsing article pages")
+    parser.add_argument("--queue-size", type=int, default=100, help="items allowed to wait between two stages")
+    parser.add_argument("--report-every", type=float, default=10, help="seconds between throughput reports")
+
+
+def parse_args(description):
+    """
+    Parse the command line of a scraper, with the options of every module it
+    runs through, and configure those modules from it.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    fetch.add_arguments(parser)
+    extract.add_arguments(parser)
+    add_arguments(parser)
+    crawl_state.add_arguments(parser)
+    frontier.add_arguments(parser)
+    seen.add_arguments(parser)
+    telemetry.add_arguments(parser)
+    args = parser.parse_args()
+    fetch.configure_from_args(args)
+    crawl_state.configure_from_args(args)
+    frontier.configure_from_args(args)
+    seen.configure_from_args(args)
+    telemetry.configure_from_args(args)
+    extract.configure_from_args(args)
+    return args
+
+
+class Pipeline:
+    """
+    Scrape a site in four stages joined by bounded queues: discovery of
+    article urls, fetching on threads, parsing in a process pool and writing
+    the rows out. A full queue blocks the stage feeding it, so no stage can
+    run far ahead of the next.
+
+    Given a frontier, urls are leased from it instead of discovered, and each
+    one is marked done once written or failed if it could not be scraped.
+    """
+
+    def __init__(self, adapter, workers=8, parse_workers=2, queue_size=100, url_frontier=None):
+        self.adapter = adapter
+        self.frontier = url_frontier
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.fetch_queue = queue.Queue(queue_size)
+        self.parse_queue = queue.Queue(queue_size)
+        self.write_queue = queue.Queue(queue_size)
+        self.stats = {name: {"done": 0, "errors": 0} for name in stage_names}
+        self.stats_lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    def record(self, stage, key, amount=1):
+        with self.stats_lock:
+            self.stats[stage][key] += amount
+        telemetry.metrics.count("scraper_stage_items_total", amount,
+                                site=self.adapter["domain"], stage=stage, outcome=key)
+
+    def start_stage(self, stage, work, num_threads, inbox, outbox, num_next):
+        """
+        Start num_threads threads taking items from inbox, and putting
+        work(item) on outbox. The last thread to finish passes the end on to
+        the num_next threads of the next stage.
+        """
+        remaining = [num_threads]
+
+        def loop():
+            while True:
+                item = inbox.get()
+                if item is end:
+                    break
+                try:
+                    result = work(item)
+                except Exception as e:
+                    self.record(stage, "errors")
+                    if self.frontier is not None:
+                        # Fetch items are (url, date) entries, parse items start with one
+                        entry = item if stage == "fetch" else item[0]
+                        self.frontier.fail(entry[0], e)
+                    continue
+                self.record(stage, "done")
+                outbox.put(result)
+            with self.stats_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                for _ in range(num_next):
+                    outbox.put(end)
+
+        threads = [threading.Thread(target=loop, daemon=True) for _ in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def leased_entries(self):
+        """
+        Yield the entries leased from the frontier until every url in it is
+        done or failed. Urls of expired or failed leases are leased again.
+        """
+        while True:
+            entries = self.frontier.lease(lease_batch)
+            yield from entries
+            if not entries:
+                counts = self.frontier.counts()
+                if counts["todo"] == 0 and counts["leased"] == 0:
+                    return
+                time.sleep(lease_poll)
+
+    def discover(self, output):
+        """Feed the urls not yet scraped to the fetch stage."""
+        # The frontier hands each url out once, and again only after it failed
+        if self.frontier is None:
+            # Articles modified since they were scraped are fetched again
+            state = self.adapter.get("state")
+            refetch = state.modified if state is not None else ()
+            entries = seen.skip_seen(output.todo(self.adapter["entries"], refetch), refetch)
+        else:
+            entries = self.leased_entries()
+        skipped = seen.get_known().skipped if seen.skip_known else 0
+        try:
+            for entry in entries:
+                self.fetch_queue.put(entry)
+                self.record("discover", "done")
+            if seen.skip_known and self.frontier is None:
+                skipped = seen.get_known().skipped - skipped
+                print(self.adapter["name"] + ": skipped " + str(skipped) + " urls we already have")
+        except Exception as e:
+            print(f"Error discovering urls: {str(e)}")
+            self.record("discover", "errors")
+        finally:
+            for _ in range(self.workers):
+                self.fetch_queue.put(end)
+
+    def fetch_page(self, entry):
+        response = fetch.get(entry[0])
+        response.raise_for_status()
+        return entry, response.content
+
+    def parse_page(self, pool, item):
+        entry, html = item
+        (title, content), seconds = pool.submit(timed_parse, self.adapter["parse"], html).result()
+        telemetry.record_parse(seconds, self.adapter["domain"])
+        return entry, title, content
+
+    def queue_depths(self):
+        """Return the depths of the fetch, parse and write queues, recording them as gauges."""
+        depths = [self.fetch_queue.qsize(), self.parse_queue.qsize(), self.write_queue.qsize()]
+        for stage, depth in zip(stage_names[1:], depths):
+            telemetry.metrics.set("scraper_queue_depth", depth, site=self.adapter["domain"], stage=stage)
+        return depths
+
+    def report(self):
+        """Print the count and throughput of each stage and the queue depths."""
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        parts = []
+        with self.stats_lock:
+            for name in stage_names:
+                stats = self.stats[name]
+                parts.append(f"{name} {stats['done']} ({stats['done']/elapsed:.1f}/s, {stats['errors']} errors)")
+        depths = self.queue_depths()
+        print(" | ".join(parts) + " | queued " + "/".join(str(depth) for depth in depths))
+
+    def run(self, report_every=10):
+        """Scrape the site, returning the stage statistics."""
+        num_parsers = 2 * self.parse_workers
+        with checkpoint.ScrapeOutput(self.adapter["output"]) as output, \
+                ProcessPoolExecutor(max_workers=self.parse_workers, initializer=extract.configure,
+                                    initargs=(extract.backend,)) as pool:
+            print(self.adapter["name"] + ": " + str(len(output.done)) + " articles already scraped")
+            threading.Thread(target=self.discover, args=(output,), daemon=True).start()
+            self.start_stage("fetch", self.fetch_page, self.workers,
+                             self.fetch_queue, self.parse_queue, num_parsers)
+            self.start_stage("parse", lambda item: self.parse_page(pool, item), num_parsers,
+                             self.parse_queue, self.write_queue, 1)
+            last_report = time.perf_counter()
+            while True:
+                try:
+                    item = self.write_queue.get(timeout=1)
+                except queue.Empty:
+                    item = False
+                if item is end:
+                    break
+                if item:
+                    (url, date), title, content = item
+                    output.write({
+                        "url": url,
+                        "date": date,
+                        "title": title,
+                        "content": content,
+                        "domain": self.adapter["domain"]
+                    })
+                    self.record("write", "done")
+                    if self.frontier is not None:
+                        self.frontier.complete(url)
+                self.queue_depths()
+                if time.perf_counter() - last_report >= report_every:
+                    self.report()
+                    last_report = time.perf_counter()
+        self.report()
+        if self.adapter.get("state") is not None and self.frontier is None:
+            self.save_state(output)
+        return self.stats
+
+    def save_state(self, output):
+        """
+        Save the crawl state: an article is done once it is in the output or
+        was already known from another file, and a modified article only once
+        it was written again this run. Modified articles written again
+        replace their old rows.
+        """
+        state = self.adapter["state"]
+        known = seen.get_known() if seen.skip_known else None
+
+        def is_done(url):
+            if url in state.modified:
+                return url in output.written
+            return url in output.done or (known is not None and known.known_before(url))
+
+        state.save(is_done)
+        print(self.adapter["name"] + ": " + state.summary())
+        if state.modified:
+            dropped = checkpoint.compact(self.adapter["output"])
+            print(self.adapter["name"] + ": replaced " + str(dropped) + " rows of modified articles")
+
+
+def run(adapter, workers=8, parse_workers=2, queue_size=100, report_every=10):
+    """
+    Scrape a site through the pipeline. With a frontier folder configured,
+    discovery fills the site's frontier and scraping works through it, as
+    frontier.role asks; each worker writes its rows to its own output file.
+    """
+    if frontier.folder is None:
+        return Pipeline(adapter, workers, parse_workers, queue_size).run(report_every)
+    with frontier.Frontier(frontier.frontier_path(frontier.folder, adapter["output"])) as url_frontier:
+        state = adapter.get("state")
+        if frontier.role in ("discover", "both"):
+            # Modified articles are queued again along with their new <lastmod>
+            refetch = state.modified if state is not None else ()
+            entries = list(seen.skip_seen(adapter["entries"], refetch))
+            lastmods = {url: lastmod for url, (lastmod, _) in state.pending.items()} if state is not None else None
+            queued = url_frontier.add(entries, lastmods)
+            print(adapter["name"] + ": " + str(queued) + " urls queued in the frontier, " + str(url_frontier.counts()))
+        if frontier.role == "discover":
+            if state is not None:
+                save_frontier_state(adapter, url_frontier)
+            return None
+        adapter = dict(adapter, output=frontier.worker_output(adapter["output"], url_frontier.worker))
+        stats = Pipeline(adapter, workers, parse_workers, queue_size, url_frontier).run(report_every)
+        print(adapter["name"] + ": frontier " + str(url_frontier.counts()))
+        if state is not None and frontier.role == "both":
+            save_frontier_state(adapter, url_frontier)
+        return stats
+
+
+def save_frontier_state(adapter, url_frontier):
+    """
+    Save the crawl state of a frontier scrape. An article is only done once
+    the frontier has it scraped with the <lastmod> found now, so articles
+    still queued or failed are found again by the next discovery; queued
+    ones are not handed out twice, since the frontier already has them.
+    """
+    state = adapter["state"]
+    done = url_frontier.done_urls({url: lastmod for url, (lastmod, _) in state.pending.items()})
+    known = seen.get_known() if seen.skip_known else None
+    state.save(lambda url: url in done or
+               (url not in state.modified and known is not None and known.known_before(url)))
+    print(adapter["name"] + ": " + state.summary())
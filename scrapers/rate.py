@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Statuses that mean the host wants us to slow down
+throttle_statuses = {403, 429, 503}
+
+# Backoff after a throttled response, in seconds, when there is no Retry-After
+backoff_base = 1.0
+backoff_cap = 120.0
+
+# A response this many times slower than the fastest seen counts as congestion
+latency_factor = 3.0
+
+
+def parse_retry_after(value):
+    """Return the seconds to wait asked for by a Retry-After header, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, min(backoff_cap, backoff_base * 2 ** attempt))
+
+
+class HostController:
+    """
+    Adapt the number of requests in flight to one host.
+
+    The limit grows by about one request per round of successful responses
+    and halves on a throttled response or when latency climbs well above the
+    fastest seen, at most once per round trip. Throttled responses also pause
+    the whole host, for Retry-After if the server sent it and for a jittered
+    exponential backoff otherwise.
+    """
+
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = min(2.0, float(max_limit))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttle_streak = 0
+        self.min_latency = None
+        self.mean_latency = None
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Wait for the host to be unpaused and for a free request slot."""
+        with self.condition:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self.condition.wait(timeout=wait if wait > 0 else None)
+
+    def decrease(self, now):
+        # Only cut once per round trip so one burst of errors counts once
+        if now - self.last_decrease >= (self.mean_latency or 0):
+            self.limit = max(1.0, self.limit / 2)
+            self.last_decrease = now
+
+    def release(self, status, latency, retry_after=None):
+        """
+        Free a request slot and adapt to how the request went. status is None
+        when the request failed without a response.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status is None or status in throttle_statuses:
+                self.decrease(now)
+                delay = retry_after if retry_after is not None else backoff_delay(self.throttle_streak)
+                self.throttle_streak += 1
+                self.paused_until = max(self.paused_until, now + delay)
+            else:
+                self.throttle_streak = 0
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+                if self.mean_latency is None:
+                    self.mean_latency = latency
+                self.mean_latency = 0.8 * self.mean_latency + 0.2 * latency
+                if self.mean_latency > latency_factor * self.min_latency:
+                    self.decrease(now)
+                else:
+                    self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.condition.notify_all()
@@ -0,0 +1,131 @@
+import glob
+import hashlib
+import threading
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+
+# Files whose "url" column lists articles we already have, relative to scrapers/
+known_sources = ["output/*.csv", "../data/input/articles.csv"]
+
+# Whether the scrapers skip urls found in known_sources
+skip_known = True
+
+_known = None
+_known_lock = threading.Lock()
+
+
+def add_arguments(parser):
+    """Add the url dedupe options to a scraper's argument parser."""
+    parser.add_argument("--refetch-known", dest="skip_known", action="store_false",
+                        help="fetch urls even if an existing output or articles.csv already has them")
+
+
+def configure_from_args(args):
+    """Configure the url dedupe from parsed scraper arguments."""
+    global skip_known
+    skip_known = args.skip_known
+
+
+def url_key(url):
+    """
+    Reduce a url to the parts that name the article: the host without "www.",
+    the path without a trailing slash and the query. The scheme and fragment
+    are dropped, so http and https links to one article match.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    key = host + parts.path.rstrip("/")
+    if parts.query:
+        key += "?" + parts.query
+    return key
+
+
+def url_hash(url):
+    """Hash a url's key to 64 bits."""
+    return int.from_bytes(hashlib.blake2b(url_key(url).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def read_urls(path, chunk_size=100000):
+    """Yield the urls in the "url" column of a CSV file, reading it in chunks."""
+    try:
+        chunks = pd.read_csv(path, usecols=["url"], dtype=str, chunksize=chunk_size, encoding="utf-8")
+        for chunk in chunks:
+            yield from chunk["url"].dropna()
+    except (ValueError, pd.errors.EmptyDataError):
+        # No "url" column, or an empty file
+        return
+
+
+class SeenUrls:
+    """
+    The set of article urls already scraped or collected, as a sorted array
+    of 64-bit url hashes (8 bytes per url), plus the urls met during this
+    run. Two different urls sharing a hash is vanishingly unlikely.
+    """
+
+    def __init__(self, sources=None):
+        paths = []
+        for pattern in known_sources if sources is None else sources:
+            paths.extend(sorted(glob.glob(pattern)))
+        hashes = np.fromiter((url_hash(url) for path in paths for url in read_urls(path)), dtype=np.uint64)
+        self.hashes = np.unique(hashes)
+        self.new = set()
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.hashes) + len(self.new)
+
+    def __contains__(self, url):
+        return self.contains_hash(url_hash(url))
+
+    def known_before(self, url):
+        """Return whether a url was known before this run."""
+        return self.loaded_hash(url_hash(url))
+
+    def loaded_hash(self, value):
+        i = np.searchsorted(self.hashes, np.uint64(value))
+        return i < len(self.hashes) and int(self.hashes[i]) == value
+
+    def contains_hash(self, value):
+        return self.loaded_hash(value) or value in self.new
+
+    def add(self, url):
+        """Add a url, returning False if it was already seen."""
+        value = url_hash(url)
+        with self.lock:
+            if self.contains_hash(value):
+                return False
+            self.new.add(value)
+            return True
+
+    def unseen(self, entries, refetch=()):
+        """
+        Yield the (url, date) entries whose url was not seen before, or is in
+        refetch, marking them seen.
+        """
+        for entry in entries:
+            if self.add(entry[0]) or entry[0] in refetch:
+                yield entry
+            else:
+                self.skipped += 1
+
+
+def get_known():
+    """Return the process's set of known urls, loading it on first use."""
+    global _known
+    with _known_lock:
+        if _known is None:
+            _known = SeenUrls()
+            print(f"{len(_known)} known urls loaded")
+        return _known
+
+
+def skip_seen(entries, refetch=()):
+    """Drop the entries with known urls not in refetch, if skip_known is set."""
+    if not skip_known:
+        return entries
+    return get_known().unseen(entries, refetch)
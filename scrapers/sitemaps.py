@@ -0,0 +1,105 @@
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+import fetch
+
+sitemap_ns  = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+news_ns     = "{http://www.google.com/schemas/sitemap-news/0.9}"
+
+
+def get_entry(url_tag):
+    """Return the loc, lastmod and news publication date of a <url> tag."""
+    entry = {
+        "loc": url_tag.find(sitemap_ns + "loc").text,
+        "lastmod": None,
+        "publication_date": None
+    }
+    lastmod_tag = url_tag.find(sitemap_ns + "lastmod")
+    if lastmod_tag is not None:
+        entry["lastmod"] = lastmod_tag.text
+    news_tag = url_tag.find(news_ns + "news")
+    if news_tag is not None:
+        date_tag = news_tag.find(news_ns + "publication_date")
+        if date_tag is not None:
+            entry["publication_date"] = date_tag.text
+    return entry
+
+
+def iter_entries(sitemap_url, on_unchanged=None):
+    """
+    Yield the entries of a sitemap as its body arrives, clearing each parsed
+    <url> tag so the document is never held in memory as a whole. If
+    on_unchanged is given, a sitemap the cache shows unchanged is not parsed
+    and on_unchanged() is called instead.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    fed = False
+    for chunk in fetch.iter_content(sitemap_url, on_unchanged=on_unchanged):
+        fed = True
+        parser.feed(chunk)
+        for event, tag in parser.read_events():
+            if root is None:
+                root = tag
+            if event == "end" and tag.tag == sitemap_ns + "url":
+                yield get_entry(tag)
+                root.clear()
+    # Nothing was fed when the sitemap was skipped as unchanged
+    if fed:
+        parser.close()
+
+
+def discover(sitemap_urls, keep_entry, workers=8, state=None):
+    """
+    Read many sitemaps at once and yield the entries passing keep_entry as
+    soon as any sitemap produces them.
+
+    With a crawl state, only new or modified entries are yielded and the
+    sitemaps it has seen complete are skipped if they have not changed.
+    """
+    entries = queue.Queue(maxsize=1000)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Give up waiting for room once the consumer has stopped
+        while not stop.is_set():
+            try:
+                entries.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def read(sitemap_url):
+        on_unchanged = None
+        if state is not None and state.sitemap_complete(sitemap_url):
+            on_unchanged = lambda: state.sitemap_unchanged(sitemap_url)
+        try:
+            for entry in iter_entries(sitemap_url, on_unchanged):
+                if stop.is_set():
+                    return
+                if keep_entry(entry) and (state is None or state.changed(entry, sitemap_url)):
+                    put(entry)
+            if state is not None:
+                state.sitemap_read(sitemap_url)
+        except Exception as e:
+            print(f"Error reading sitemap {sitemap_url}: {str(e)}")
+        finally:
+            put(done)
+
+    sitemap_urls = list(sitemap_urls)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for sitemap_url in sitemap_urls:
+            pool.submit(read, sitemap_url)
+        num_done = 0
+        while num_done < len(sitemap_urls):
+            entry = entries.get()
+            if entry is done:
+                num_done += 1
+                continue
+            yield entry
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
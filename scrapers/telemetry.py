@@ -0,0 +1,222 @@
+import atexit
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Upper bounds, in seconds, of the request latency and parse time buckets
+latency_buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")]
+parse_buckets = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, float("inf")]
+
+# File the metrics are written to, None to keep them in memory only, and
+# seconds between writes. A path ending in ".prom" gets the Prometheus text
+# format, any other path JSON
+metrics_path = None
+flush_every = 10.0
+
+_flusher = None
+
+
+class Histogram:
+    """Counts of observations at or below each bucket bound, with their sum."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        counts = []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class Telemetry:
+    """
+    Counters, gauges and histograms, each keyed by a metric name and a tuple
+    of (label, value) pairs, safe to update from any thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.last_flush = (self.start_time, 0)
+
+    def count(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, buckets, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def total(self, name):
+        with self.lock:
+            return sum(self.counters.get(name, {}).values())
+
+    def to_json(self):
+        """Return the metrics, with overall and recent request rates, as a dict."""
+        now = time.time()
+        requests = self.total("scraper_requests_total")
+        last_time, last_requests = self.last_flush
+        with self.lock:
+            report = {
+                "time": now,
+                "uptime_seconds": now - self.start_time,
+                "requests_per_second": requests / max(now - self.start_time, 1e-9),
+                "recent_requests_per_second": (requests - last_requests) / max(now - last_time, 1e-9),
+                "counters": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                             for name, series in self.counters.items()},
+                "gauges": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                           for name, series in self.gauges.items()},
+                "histograms": {name: [{"labels": dict(key),
+                                       "buckets": {str(bound): count for bound, count
+                                                   in zip(histogram.buckets, histogram.cumulative())},
+                                       "sum": histogram.sum,
+                                       "count": histogram.count,
+                                       "mean": histogram.sum / histogram.count if histogram.count else None}
+                                      for key, histogram in series.items()]
+                               for name, series in self.histograms.items()}
+            }
+        self.last_flush = (now, requests)
+        return report
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        def label_text(key, extra=()):
+            pairs = list(key) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{label}="{value}"' for label, value in pairs) + "}"
+
+        lines = [f"scraper_uptime_seconds {time.time() - self.start_time}"]
+        with self.lock:
+            for name, series in self.counters.items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{label_text(key)} {value}" for key, value in series.items())
+            for name, series in self.gauges.items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{label_text(key)} {value}" for key, value in series.items())
+            for name, series in self.histograms.items():
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                        le = "+Inf" if bound == float("inf") else str(bound)
+                        lines.append(f"{name}_bucket{label_text(key, [('le', le)])} {count}")
+                    lines.append(f"{name}_sum{label_text(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{label_text(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Telemetry()
+
+
+def host_of(url):
+    return urlsplit(url).netloc
+
+
+def record_response(url, status, latency):
+    """Record a response to a request and how long it took."""
+    host = host_of(url)
+    metrics.count("scraper_requests_total", host=host, status=str(status))
+    metrics.observe("scraper_request_seconds", latency, latency_buckets, host=host)
+
+
+def record_error(url, error):
+    """Record a request that failed without a response."""
+    metrics.count("scraper_requests_total", host=host_of(url), status="error")
+    metrics.count("scraper_request_errors_total", host=host_of(url), error=type(error).__name__)
+
+
+def record_bytes(url, amount):
+    """Record bytes of response body received."""
+    metrics.count("scraper_response_bytes_total", amount, host=host_of(url))
+
+
+def record_cache(url, outcome):
+    """Record a cache lookup: "hit", "revalidated" or "miss"."""
+    metrics.count("scraper_cache_total", host=host_of(url), outcome=outcome)
+
+
+def record_parse(seconds, site):
+    """Record the time taken to parse an article page."""
+    metrics.observe("scraper_parse_seconds", seconds, parse_buckets, site=site)
+
+
+def add_arguments(parser):
+    """Add the telemetry options to a scraper's argument parser."""
+    parser.add_argument("--metrics", default=None,
+                        help="file to write scraper metrics to, in Prometheus text format if it ends in .prom")
+    parser.add_argument("--metrics-every", type=float, default=flush_every, help="seconds between metrics writes")
+
+
+def configure_from_args(args):
+    """Configure the telemetry from parsed scraper arguments, starting the writer if needed."""
+    global metrics_path, flush_every
+    metrics_path = args.metrics
+    flush_every = args.metrics_every
+    if metrics_path is not None:
+        start()
+
+
+def flush():
+    """Write the metrics to metrics_path, atomically."""
+    if metrics_path is None:
+        return
+    if metrics_path.endswith(".prom"):
+        text = metrics.to_prometheus()
+    else:
+        text = json.dumps(metrics.to_json(), indent=1)
+    folder = os.path.dirname(metrics_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temp_path = f"{metrics_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as fp:
+        fp.write(text)
+    os.replace(temp_path, metrics_path)
+
+
+def start():
+    """Write the metrics every flush_every seconds, and once more at exit."""
+    global _flusher
+    if _flusher is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(flush_every)
+            try:
+                flush()
+            except OSError as e:
+                print(f"Error writing metrics: {str(e)}")
+
+    _flusher = threading.Thread(target=loop, daemon=True)
+    _flusher.start()
+    atexit.register(flush)
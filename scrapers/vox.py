@@ -1,91 +1,95 @@
-import xml.etree.ElementTree as ET
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+import crawl_state
+import extract
+import fetch
+import pipeline
+import sitemaps
 
 ###################
 ### Vox Scraper ###
 ###################
+def get_sitemap_urls():
+    sitemap_urls = []
+    for m in range(1, 13):
+        month = str(m)
+        sitemap_urls.append(f"https://www.vox.com/sitemaps/entries/2023/{month}")
+    return sitemap_urls
+
+def keep_entry(entry):
+    """Keep every entry; the monthly sitemaps only list 2023 articles."""
+    return True
+
+def iter_urls(workers=8, state=None):
+    """
+    Yield the (url, date) of each article as the monthly sitemaps are read,
+    only the new or modified ones given a crawl state.
+    """
+    for entry in sitemaps.discover(get_sitemap_urls(), keep_entry, workers, state):
+        yield entry["loc"], entry["lastmod"]
+
 def get_urls():
     urls = []
     dates = []
-    for m in range(1, 13):
-        month = str(m)
-        sitemap_url = f"https://www.vox.com/sitemaps/entries/2023/{month}"
-        temp_urls, temp_dates = parse_sitemap(sitemap_url)
-        urls.extend(temp_urls)
-        dates.extend(temp_dates)
+    for url, date in iter_urls():
+        urls.append(url)
+        dates.append(date)
     return urls, dates
 
 def parse_sitemap(sitemap_url):
     """Parse the sitemap from Vox and return a list of tuples containing article URLs and last modified dates."""
-    response = requests.get(sitemap_url)
-    sitemap_content = response.text
-    root = ET.fromstring(sitemap_content)
-
     urls = []
     dates = []
-    for url_tag in root.findall('{http://www.sitemaps.org/schemas/sitemap/0.9}url'):
-        loc = url_tag.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc').text
-        lastmod = url_tag.find('{http://www.sitemaps.org/schemas/sitemap/0.9}lastmod').text
-        urls.append(loc)
-        dates.append(lastmod)
-
+    for entry in sitemaps.iter_entries(sitemap_url):
+        urls.append(entry["loc"])
+        dates.append(entry["lastmod"])
     return urls, dates
 
-def scrape(url):
-    """Scrape a Vox article and return its title, summary, and content."""
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+# Where Vox keeps the title and content of an article
+article_spec = {
+    # The first <h1> tag with class "c-page-title"
+    "title": {"path": [("h1", {"class": "c-page-title"})], "missing": "No title found"},
+    "content": [
+        # The first <p> tag with class "c-entry-summary"
+        {"path": [("p", {"class": "c-entry-summary"})], "missing": "No summary found"},
+        # All <p> tags inside <div> tag with class "c-entry-content"
+        {"path": [("div", {"class": "c-entry-content"})], "paragraphs": True, "missing": "No content found"}
+    ]
+}
+article_strainer = extract.get_strainer(article_spec)
 
-        # Extracting the title from the first <h1> tag with class "c-page-title"
-        title_tag = soup.find('h1', class_='c-page-title')
-        title = title_tag.get_text().strip() if title_tag else 'No title found'
 
-        # Extracting the summary from the first <p> tag with class "c-entry-summary"
-        summary_tag = soup.find('p', class_='c-entry-summary')
-        summary = summary_tag.get_text().strip() if summary_tag else 'No summary found'
+def parse_article(html):
+    """Return the title and content of a Vox article page."""
+    return extract.extract(article_spec, html, article_strainer)
 
-        # Extracting the content from all <p> tags inside <div> tag with class "c-entry-content"
-        content_tag = soup.find('div', class_='c-entry-content')
-        content = ' '.join(p.get_text().strip() for p in content_tag.find_all('p')) if content_tag else 'No content found'
 
-        content = summary + " " + content
-
-        return title, content
+def scrape(url):
+    """Scrape a Vox article and return its title, summary, and content."""
+    try:
+        response = fetch.get(url)
+        response.raise_for_status()
+        return parse_article(response.content)
 
 
     except Exception as e:
         return None, None
 
-def main():
-    data = {
-        "url": [],
-        "date": [],
-        "title": [],
-        "content": [],
-        "domain": []
+def get_adapter(workers=8):
+    """Plug Vox into the scraping pipeline."""
+    output = "output/vox.csv"
+    state = crawl_state.get_state(output)
+    return {
+        "name": "Vox",
+        "domain": "vox",
+        "output": output,
+        "entries": iter_urls(workers, state),
+        "parse": parse_article,
+        "state": state
     }
-    urls, dates = get_urls()
-    N = len(urls)
-    print(N)
-    interval = N // 10
-    for i in range(len(urls)):
-        title, content = scrape(urls[i])
-        if title is None or content is None:
-            continue
-        data["url"].append(urls[i])
-        data["date"].append(dates[i])
-        data["title"].append(title)
-        data["content"].append(content)
-        data["domain"].append("vox")
-        if i % interval == 0:
-            print(f"{round(100*i/N, 2)}% done!")
+
+def main(workers=8, parse_workers=2, queue_size=100, report_every=10):
+    pipeline.run(get_adapter(workers), workers, parse_workers, queue_size, report_every)
     print("All done!")
-    df = pd.DataFrame(data)
-    df.to_csv("output/vox.csv")
 
 if __name__ == "__main__":
-    main()
+    args = pipeline.parse_args("Scrape Vox articles.")
+    main(args.workers, args.parse_workers, args.queue_size, args.report_every)
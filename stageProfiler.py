@@ -0,0 +1,275 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+def currentRss():
+    """Return the resident memory of this process in bytes, or None where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def maxRss():
+    """Return the highest resident memory this process has reached, in MB."""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+# CPU seconds reported by the workers of pools that outlive a stage, which
+# getrusage only counts once they exit
+workerCpuSeconds = 0.0
+workerCpuLock = threading.Lock()
+
+
+def addWorkerCpu(seconds):
+    """Add CPU seconds used by a worker process that is still running."""
+    global workerCpuSeconds
+    with workerCpuLock:
+        workerCpuSeconds += seconds
+
+
+def childCpu():
+    """
+    Return the CPU seconds used by child processes: those that have exited,
+    such as the workers of a pool shut down inside a stage, and those reported
+    with addWorkerCpu by the workers of a pool kept for a whole run.
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + workerCpuSeconds
+
+
+class PeakRss:
+    """
+    Sample the resident memory every few milliseconds while a stage runs and
+    keep the highest value seen. Unlike tracemalloc this counts numpy and
+    pandas buffers and barely slows the stage down.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = currentRss()
+        self.peak = self.start
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.stop.wait(self.interval):
+            self.peak = max(self.peak, currentRss())
+
+    def __enter__(self):
+        if self.start is not None:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        if self.start is not None:
+            self.thread.join()
+            self.peak = max(self.peak, currentRss())
+
+    def peakMB(self):
+        """Return the peak resident memory in MB, or None if memory cannot be read."""
+        return None if self.start is None else self.peak / 2**20
+
+    def growth(self):
+        """Return the peak growth over the starting memory in MB, or None if memory cannot be read."""
+        return None if self.start is None else (self.peak - self.start) / 2**20
+
+
+class SamplingProfiler:
+    """
+    Sample the stack of one thread every few milliseconds and count, for each
+    function, the samples it was running in (cumulative) and on top of the
+    stack (self). Only this process is sampled, so with a worker pool the
+    filter's own work is not seen.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.threadId = None
+        self.selfCounts = Counter()
+        self.cumulativeCounts = Counter()
+        self.samples = 0
+        self.stop = None
+        self.thread = None
+
+    def sample(self):
+        while not self.stop.wait(self.interval):
+            frame = sys._current_frames().get(self.threadId)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.selfCounts[self.describe(frame)] += 1
+            seen = set()
+            while frame is not None:
+                name = self.describe(frame)
+                if name not in seen:
+                    self.cumulativeCounts[name] += 1
+                    seen.add(name)
+                frame = frame.f_back
+
+    @staticmethod
+    def describe(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def __enter__(self):
+        # Sample the calling thread; a profiler can be entered again to add samples
+        self.threadId = threading.get_ident()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        self.thread.join()
+
+    def report(self, top=15):
+        """Return the functions with the most self and cumulative samples, as fractions of all samples."""
+        total = max(self.samples, 1)
+        return {
+            "intervalSeconds": self.interval,
+            "samples": self.samples,
+            "self": [{"function": name, "fraction": count / total} for name, count in self.selfCounts.most_common(top)],
+            "cumulative": [{"function": name, "fraction": count / total}
+                           for name, count in self.cumulativeCounts.most_common(top)]
+        }
+
+
+class StageRecord:
+    """The measurements of one run of a stage. Set rowsOut inside the stage."""
+
+    def __init__(self, name, parent, rowsIn):
+        self.name = name
+        self.parent = parent
+        self.rowsIn = rowsIn
+        self.rowsOut = None
+        self.wallSeconds = None
+        self.cpuSeconds = None
+        self.peakRssMB = None
+        self.rssGrowthMB = None
+
+    def toDict(self):
+        return {
+            "stage": self.name,
+            "parent": self.parent,
+            "rowsIn": self.rowsIn,
+            "rowsOut": self.rowsOut,
+            "wallSeconds": self.wallSeconds,
+            "cpuSeconds": self.cpuSeconds,
+            "peakRssMB": self.peakRssMB,
+            "rssGrowthMB": self.rssGrowthMB
+        }
+
+
+class StageProfiler:
+    """
+    Record the wall time, CPU time (this process and its worker processes,
+    see childCpu), peak resident memory and rows in and out of each stage of
+    a run. Stages can be nested; a stage run several times, as in chunked
+    runs, is added up in the summary.
+    """
+
+    def __init__(self, name, sampleStages=()):
+        self.name = name
+        self.sampleStages = set(sampleStages)
+        self.records = []
+        self.samplers = {}
+        self.stack = []
+        self.startTime = time.perf_counter()
+        self.startedAt = datetime.now(timezone.utc).isoformat()
+
+    @contextmanager
+    def stage(self, name, rowsIn=None):
+        """Measure the code run inside the with block as a stage."""
+        record = StageRecord(name, self.stack[-1].name if self.stack else None, rowsIn)
+        self.records.append(record)
+        self.stack.append(record)
+        if name in self.sampleStages and name not in self.samplers:
+            self.samplers[name] = SamplingProfiler()
+        sampler = self.samplers.get(name)
+        try:
+            with PeakRss() as rss:
+                if sampler is not None:
+                    sampler.__enter__()
+                wallStart = time.perf_counter()
+                cpuStart = time.process_time() + childCpu()
+                try:
+                    yield record
+                finally:
+                    record.wallSeconds = time.perf_counter() - wallStart
+                    record.cpuSeconds = time.process_time() + childCpu() - cpuStart
+                    if sampler is not None:
+                        sampler.__exit__(None, None, None)
+            record.peakRssMB = rss.peakMB()
+            record.rssGrowthMB = rss.growth()
+        finally:
+            self.stack.pop()
+
+    def summary(self):
+        """Return the stages in the order first run, adding up repeated runs of a stage."""
+        stages = {}
+        for record in self.records:
+            values = record.toDict()
+            key = (record.parent, record.name)
+            if key not in stages:
+                stages[key] = dict(values, runs=0, wallSeconds=0.0, cpuSeconds=0.0,
+                                   rowsIn=None, rowsOut=None, peakRssMB=None, rssGrowthMB=None)
+            total = stages[key]
+            total["runs"] += 1
+            total["wallSeconds"] += values["wallSeconds"] or 0
+            total["cpuSeconds"] += values["cpuSeconds"] or 0
+            for field in ["rowsIn", "rowsOut"]:
+                if values[field] is not None:
+                    total[field] = (total[field] or 0) + values[field]
+            for field in ["peakRssMB", "rssGrowthMB"]:
+                if values[field] is not None:
+                    total[field] = values[field] if total[field] is None else max(total[field], values[field])
+        return list(stages.values())
+
+    def report(self, args=None):
+        """Return the run report as a dict that can be written as JSON."""
+        return {
+            "script": self.name,
+            "startedAt": self.startedAt,
+            "args": args,
+            "totalSeconds": time.perf_counter() - self.startTime,
+            "maxRssMB": maxRss(),
+            "stages": self.summary(),
+            "runs": [record.toDict() for record in self.records],
+            "sampling": {name: sampler.report() for name, sampler in self.samplers.items()}
+        }
+
+    def writeReport(self, filename, args=None):
+        """Write the run report to a JSON file."""
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(filename, "w") as fp:
+            json.dump(self.report(args), fp, indent=1)
+
+    def printSummary(self):
+        """Print a table of the stages."""
+        print(f"{'Stage':<34}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}{'rows in':>10}{'rows out':>10}")
+        for stage in self.summary():
+            name = ("  " if stage["parent"] else "") + stage["stage"]
+            peak = f"{stage['peakRssMB']:9.0f}" if stage["peakRssMB"] is not None else f"{'':>9}"
+            rowsIn = stage["rowsIn"] if stage["rowsIn"] is not None else ""
+            rowsOut = stage["rowsOut"] if stage["rowsOut"] is not None else ""
+            print(f"{name:<34}{stage['wallSeconds']:9.2f}{stage['cpuSeconds']:9.2f}{peak}{rowsIn:>10}{rowsOut:>10}")
+        for name, sampler in self.samplers.items():
+            sampling = sampler.report()
+            print(f"Hottest functions in {name} ({sampling['samples']} samples):")
+            for entry in sampling["self"][:10]:
+                print(f"  {100 * entry['fraction']:5.1f}%  {entry['function']}")
@@ -0,0 +1,162 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+indexFilename = "data/output/unionIndex.npz"
+
+
+class IndexBuilder:
+    """
+    Collect the union mentions of the articles kept while filtering, chunk
+    by chunk, and build a UnionIndex from them.
+    """
+
+    def __init__(self, unions):
+        # Repeated names would get two posting lists for the same mentions
+        self.unions = list(dict.fromkeys(unions))
+        self.numArticles = 0
+        self.unionIds = []
+        self.articles = []
+        self.hits = []
+        self.firstOffsets = []
+
+    def add(self, articleIds, counts, numScanned=None):
+        """
+        Add the countUnions results of a batch of articles. The union indexes
+        of counts are positions in self.unions. numScanned is the number of
+        articles the batch was filtered from, if more than were passed.
+        """
+        self.numArticles += len(articleIds) if numScanned is None else numScanned
+        unionIds, articles, hits, firstOffsets = [], [], [], []
+        for articleId, articleCounts in zip(articleIds, counts):
+            for unionId, (numHits, firstOffset) in articleCounts.items():
+                unionIds.append(unionId)
+                articles.append(articleId)
+                hits.append(numHits)
+                firstOffsets.append(firstOffset)
+        self.unionIds.append(np.array(unionIds, dtype=np.int32))
+        self.articles.append(np.array(articles, dtype=np.int64))
+        self.hits.append(np.array(hits, dtype=np.int32))
+        self.firstOffsets.append(np.array(firstOffsets, dtype=np.int64))
+
+    def build(self):
+        """
+        Sort the postings by union and then article into compressed sparse
+        rows: the postings of union i are at indptr[i]:indptr[i + 1].
+        """
+        unionIds = np.concatenate(self.unionIds) if self.unionIds else np.zeros(0, dtype=np.int32)
+        articles = np.concatenate(self.articles) if self.articles else np.zeros(0, dtype=np.int64)
+        hits = np.concatenate(self.hits) if self.hits else np.zeros(0, dtype=np.int32)
+        firstOffsets = np.concatenate(self.firstOffsets) if self.firstOffsets else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((articles, unionIds))
+        indptr = np.zeros(len(self.unions) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(unionIds, minlength=len(self.unions)), out=indptr[1:])
+        return UnionIndex(self.unions, indptr, articles[order], hits[order], firstOffsets[order], self.numArticles)
+
+
+class UnionIndex:
+    """
+    An inverted index from each union name to the articles mentioning it,
+    with the number of mentions and the word offset of the first one in the
+    normalized content. Article ids are the row labels of the cleaned data,
+    the first column of cleanedData.csv. Lookups only touch the postings of
+    the unions asked about, never the articles.
+    """
+
+    def __init__(self, unions, indptr, articles, hits, firstOffsets, numArticles):
+        self.unions = list(unions)
+        self.indptr = indptr
+        self.articleIds = articles
+        self.hits = hits
+        self.firstOffsets = firstOffsets
+        self.numArticles = numArticles
+        self.positions = {union: i for i, union in enumerate(self.unions)}
+
+    def save(self, filename=indexFilename):
+        """Write the index as a .npz file of its arrays."""
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        np.savez(filename, unions=np.array(self.unions, dtype=str), indptr=self.indptr,
+                 articles=self.articleIds, hits=self.hits, firstOffsets=self.firstOffsets,
+                 numArticles=np.array(self.numArticles))
+
+    @classmethod
+    def load(cls, filename=indexFilename):
+        """Read an index written by save."""
+        with np.load(filename) as arrays:
+            return cls(arrays["unions"].tolist(), arrays["indptr"], arrays["articles"],
+                       arrays["hits"], arrays["firstOffsets"], int(arrays["numArticles"]))
+
+    def span(self, union):
+        """Return the slice of the postings of a union, empty for unknown names."""
+        i = self.positions.get(union)
+        if i is None:
+            return slice(0, 0)
+        return slice(self.indptr[i], self.indptr[i + 1])
+
+    def articles(self, union):
+        """Return the sorted ids of the articles mentioning a union."""
+        return self.articleIds[self.span(union)]
+
+    def postings(self, union):
+        """Return the articles mentioning a union with their hit counts and first offsets."""
+        span = self.span(union)
+        return pd.DataFrame({"article": self.articleIds[span], "hits": self.hits[span],
+                             "firstOffset": self.firstOffsets[span]})
+
+    def articlesMentioning(self, unions, every=False):
+        """Return the ids of the articles mentioning any of the unions, or every one of them."""
+        lists = [self.articles(union) for union in unions]
+        if not lists:
+            return np.zeros(0, dtype=np.int64)
+        result = lists[0]
+        for articles in lists[1:]:
+            result = np.intersect1d(result, articles) if every else np.union1d(result, articles)
+        return np.unique(result)
+
+    def frequencies(self):
+        """Return the number of articles and of mentions of each union, most mentioned first."""
+        numPostings = np.diff(self.indptr)
+        unionIds = np.repeat(np.arange(len(self.unions)), numPostings)
+        hits = np.bincount(unionIds, weights=self.hits, minlength=len(self.unions)).astype(np.int64)
+        data = pd.DataFrame({"union": self.unions, "articles": numPostings, "hits": hits})
+        return data.sort_values(["articles", "hits"], ascending=False, kind="stable").reset_index(drop=True)
+
+    def subsetFrequencies(self, articleIds):
+        """
+        Return frequencies counted over a subset of the articles only, for
+        example the ids of the right-leaning rows of the cleaned data.
+        """
+        numPostings = np.diff(self.indptr)
+        unionIds = np.repeat(np.arange(len(self.unions)), numPostings)
+        inSubset = np.isin(self.articleIds, np.asarray(articleIds, dtype=np.int64))
+        articles = np.bincount(unionIds[inSubset], minlength=len(self.unions))
+        hits = np.bincount(unionIds[inSubset], weights=self.hits[inSubset], minlength=len(self.unions)).astype(np.int64)
+        data = pd.DataFrame({"union": self.unions, "articles": articles, "hits": hits})
+        data = data[data["articles"] > 0]
+        return data.sort_values(["articles", "hits"], ascending=False, kind="stable").reset_index(drop=True)
+
+    def unionsOf(self, articleId):
+        """Return the unions mentioned by an article."""
+        positions = np.flatnonzero(self.articleIds == articleId)
+        unionIds = np.searchsorted(self.indptr, positions, side="right") - 1
+        return [self.unions[i] for i in unionIds]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up the articles mentioning unions in the union index.")
+    parser.add_argument("unions", nargs="*", help="union names to look up")
+    parser.add_argument("--index", default=indexFilename, help="index file written by cleanData.py")
+    parser.add_argument("--top", type=int, default=0, help="list the unions mentioned by the most articles")
+    args = parser.parse_args()
+    index = UnionIndex.load(args.index)
+    print(f"{len(index.articleIds)} postings of {len(index.unions)} unions over {index.numArticles} articles")
+    for union in args.unions:
+        postings = index.postings(union)
+        print(f"{union}: {postings.shape[0]} articles, {postings['hits'].sum()} mentions")
+        if not postings.empty:
+            print(postings.head(10).to_string(index=False))
+    if args.top:
+        print(index.frequencies().head(args.top).to_string(index=False))
@@ -0,0 +1,160 @@
+# Byte table mapping ASCII letters and digits to themselves and every other
+# byte to a space
+normalizeTable = bytes(byte if chr(byte).isascii() and chr(byte).isalnum() else ord(" ") for byte in range(256))
+
+def normalizeText(text):
+    """
+    Normalize text for union matching: lowercase and replace every character
+    that is not a letter or digit with a space.
+    """
+    return normalizeColumn([text])[0]
+
+
+def normalizeColumn(texts, blockChars=2**24):
+    """
+    Normalize a whole column of texts at once, giving the same result as
+    normalizeText on each of them.
+
+    The lowercased texts are joined into blocks of about blockChars
+    characters, and each block is encoded to ASCII and run through a byte
+    translation table in one call. Encoding replaces every non-ASCII
+    character with a single "?", so character offsets are kept and each
+    text is sliced back out of its block by its lowercased length.
+    """
+    lowered = [text.lower() for text in texts]
+    normalized = []
+    start = 0
+    while start < len(lowered):
+        end = start
+        size = 0
+        while end < len(lowered) and (end == start or size + len(lowered[end]) <= blockChars):
+            size += len(lowered[end])
+            end += 1
+        block = "".join(lowered[start:end]).encode("ascii", errors="replace").translate(normalizeTable).decode("ascii")
+        offset = 0
+        for text in lowered[start:end]:
+            normalized.append(block[offset:offset + len(text)])
+            offset += len(text)
+        start = end
+    return normalized
+
+
+def buildMatcher(unions):
+    """
+    Build an Aho-Corasick automaton over the words of the given union names.
+
+    The old check was `" " + union + " " in " " + text + " "`. Since both sides
+    are padded with spaces, that is the same as asking whether the words of
+    `union.split(" ")` appear back to back in `text.split(" ")`, so the automaton
+    runs over words instead of characters. Empty words are kept so that names
+    with doubled spaces keep matching exactly as before.
+    """
+    vocabulary = {}
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+
+    # Build the trie
+    for unionIndex, union in enumerate(unions):
+        state = 0
+        for word in union.split(" "):
+            wordId = vocabulary.setdefault(word, len(vocabulary))
+            nextState = goto[state].get(wordId)
+            if nextState is None:
+                nextState = len(goto)
+                goto[state][wordId] = nextState
+                goto.append({})
+                fail.append(0)
+                output.append([])
+            state = nextState
+        output[state].append(unionIndex)
+
+    # Breadth first pass to set the failure links
+    queue = list(goto[0].values())
+    for state in queue:
+        for wordId, nextState in goto[state].items():
+            queue.append(nextState)
+            fallback = fail[state]
+            while fallback and wordId not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[nextState] = goto[fallback].get(wordId, 0)
+            output[nextState].extend(output[fail[nextState]])
+
+    return {
+        "unions": list(unions),
+        "vocabulary": vocabulary,
+        "goto": goto,
+        "fail": fail,
+        "output": [tuple(o) for o in output],
+        "lengths": [len(union.split(" ")) for union in unions]
+    }
+
+
+def findUnions(matcher, text):
+    """
+    Yield (union index, word offset) for every union hit in normalized text.
+
+    The word offset is the position of the first word of the hit in
+    `text.split(" ")`.
+    """
+    vocabulary  = matcher["vocabulary"]
+    goto        = matcher["goto"]
+    fail        = matcher["fail"]
+    output      = matcher["output"]
+    lengths     = matcher["lengths"]
+    state = 0
+    for position, word in enumerate(text.split(" ")):
+        wordId = vocabulary.get(word)
+        if wordId is None:
+            state = 0
+            continue
+        while state and wordId not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(wordId, 0)
+        if output[state]:
+            for unionIndex in output[state]:
+                yield unionIndex, position - lengths[unionIndex] + 1
+
+
+def countUnions(matcher, text):
+    """
+    Return {union index: [hits, first word offset]} for every union
+    mentioned in normalized text.
+    """
+    counts = {}
+    for unionIndex, offset in findUnions(matcher, text):
+        if unionIndex in counts:
+            counts[unionIndex][0] += 1
+        else:
+            counts[unionIndex] = [1, offset]
+    return counts
+
+
+def hasUnion(matcher, text) -> bool:
+    """
+    Return whether normalized text mentions any union.
+    """
+    for _ in findUnions(matcher, text):
+        return True
+    return False
+
+
+def columnMask(matcher, columns):
+    """
+    Return, for each row of equally long text columns, whether any of its
+    texts mentions a union. Each column is normalized once with normalizeColumn.
+    """
+    mask = [False] * len(columns[0])
+    for column in columns:
+        for row, text in enumerate(normalizeColumn(column)):
+            if not mask[row] and hasUnion(matcher, text):
+                mask[row] = True
+    return mask
+
+
+def columnCounts(matcher, column):
+    """
+    Return countUnions for each text of a column, normalizing the column once.
+    Unlike columnMask, every text is scanned to the end.
+    """
+    return [countUnions(matcher, text) for text in normalizeColumn(column)]